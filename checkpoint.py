@@ -0,0 +1,151 @@
+'''
+Saves the full state of a simulation to a single NPZ file and restores a Model from it.
+
+The file holds NumPy arrays only (no pickled objects): the population's columns and routines, the compartments, the
+scheduled events (as ID arrays), the recorded results so far, the Emergency Level, the current day and the state of the
+model's random number Generator. The arrays are stored uncompressed, so restoring is limited by the disk speed.
+
+Example:
+    model.Run(364, checkpointInterval=7, checkpointPath="run.npz") # Saves the state every week.
+    model = LoadCheckpoint("run.npz") # Continues with model.Run(...)
+'''
+
+import json
+import os
+import numpy as np
+from model import Model
+from engine import VectorizedEngine
+
+PARAMETERS = ["numberOfPpl", "startingInfectiousPercentage", "daysOfInfection", "daysOfSimulation", "r0", "modelType", "resultsType", "engine", "emergencyThresholds", "transmissionMode", "stepping", "backend", "hybridThreshold"]
+POPULATION_COLUMNS = ["healthFactor", "hygieneFactor", "legalityFactor", "agegroup", "houseID", "isHospitalized", "hospitalLocation", "levelType", "defaultID"]
+
+
+def SaveCheckpoint(model, path):
+    '''
+    Writes the state of the model to "path". The file is written next to it first and then renamed,
+    so a job that is killed while saving leaves the previous checkpoint intact.
+    '''
+    arrays = {}
+    parameters = {name: getattr(model, name) for name in PARAMETERS}
+    parameters.update(currentDay=model.currentDay, emergencyLevel=model.emergencyLevel, familiesCreated=model.familiesCreated,
+                      rngState=model.rng.bit_generator.state, outputs=OutputPositions(model))
+    if (model.infectionLog is not None):
+        parameters["infectionLogRngState"] = model.infectionLog.rng.bit_generator.state
+    arrays["parameters"] = np.array(json.dumps(parameters))
+
+    for name in POPULATION_COLUMNS:
+        arrays["population." + name] = getattr(model.population, name)
+
+    compartments = model.compartments
+    arrays["compartments.state"] = compartments.state
+    arrays["compartments.infectious"] = compartments.Infectious()
+
+    recorder = model.recorder
+    for name in recorder.ARRAYS:
+        arrays["recorder." + name] = getattr(recorder, name)[:recorder.numberOfDays]
+    arrays["randomBuffer"] = np.array(model.random.block[model.random.index:], dtype=np.float64) # Numbers drawn but not used yet.
+
+    arrays["hospitalOccupancy"] = np.array(model.vectorizedEngine.hospitalOccupancy if (model.vectorizedEngine is not None) else model.hospitalVisitors)
+    arrays["importedPeople"] = model.importedPeople
+    arrays.update(PackEvents(model.events))
+
+    temporaryPath = path + ".tmp"
+    with open(temporaryPath, "wb") as file:
+        np.savez(file, **arrays)
+    os.replace(temporaryPath, path)
+
+
+def LoadCheckpoint(path, headless=True, sinks=None, infectionLog=None):
+    '''
+    Returns a Model with the state saved in "path". The simulation continues with Model.Run.
+    sinks, infectionLog: Outputs of the continued run (see Model), e.g. sinks and a log that append to the files of the interrupted run.
+                         The files that were outputs of the saved model are truncated to their size when the checkpoint was saved.
+    '''
+    with np.load(path) as data:
+        parameters = json.loads(str(data["parameters"]))
+        model = Model(**{name: parameters[name] for name in PARAMETERS if (name in parameters)}, headless=True, sinks=sinks, infectionLog=infectionLog, build=False)
+        model.headless = headless
+        TruncateOutputs(model, parameters.get("outputs", {}))
+        model.rng.bit_generator.state = parameters["rngState"]
+        if (infectionLog is not None and "infectionLogRngState" in parameters):
+            infectionLog.rng.bit_generator.state = parameters["infectionLogRngState"]
+        model.random.block = data["randomBuffer"].tolist()
+        model.random.index = 0
+
+        population = model.population
+        for name in POPULATION_COLUMNS:
+            getattr(population, name)[...] = data["population." + name]
+        model.familiesCreated = parameters["familiesCreated"]
+        model.peopleCreated = len(population)
+        model.CreateLocations()
+
+        model.currentDay = parameters["currentDay"]
+        model.emergencyLevel = parameters["emergencyLevel"]
+        population.SetEmergencyLevel(model.emergencyLevel)
+        model.transmission.SetEmergencyLevel(model.emergencyLevel)
+        model.compartments.Restore(data["compartments.state"], data["compartments.infectious"])
+        recorder = model.recorder
+        if ("recorder.counts" in data):
+            recorder.Reserve(model.daysOfSimulation)
+            recorder.numberOfDays = len(data["recorder.counts"])
+            for name in recorder.ARRAYS:
+                getattr(recorder, name)[:recorder.numberOfDays] = data["recorder." + name]
+        else: # Checkpoint saved with the percentages only.
+            levels = data["emergencyLevelsPerDay"]
+            for day, (percentages, level) in enumerate(zip(data["percentagesPerDay"], levels)):
+                recorder.StartDay(day, np.round(percentages * model.numberOfPpl / 100), level, 0)
+
+        UnpackEvents(data, model.events)
+        if ("importedPeople" in data):
+            model.importedPeople = data["importedPeople"].astype(np.int64)
+        model.hospitalVisitors = int(data["hospitalOccupancy"]) if ("hospitalOccupancy" in data) else 0
+        if (model.engine == "vectorized"):
+            engine = VectorizedEngine(model)
+            engine.hospitalOccupancy = model.hospitalVisitors
+            engine.currentDay = model.currentDay
+            engine.emergencyLevel = model.emergencyLevel
+            model.vectorizedEngine = engine
+
+    return model
+
+
+def OutputPositions(model):
+    '''
+    Returns the size of each output file of the model (sinks and infection log) as a dictionary (absolute path: size).
+    '''
+    outputs = list(model.sinks) + ([model.infectionLog] if (model.infectionLog is not None) else [])
+    return {os.path.abspath(output.path): output.Position() for output in outputs if (output.path is not None)}
+
+
+def TruncateOutputs(model, positions):
+    '''
+    Truncates the output files of the model that were saved in the checkpoint to their saved sizes (see OutputPositions).
+    '''
+    outputs = list(model.sinks) + ([model.infectionLog] if (model.infectionLog is not None) else [])
+    for output in outputs:
+        if (output.path is not None and os.path.abspath(output.path) in positions):
+            output.Truncate(positions[os.path.abspath(output.path)])
+
+
+def PackEvents(events):
+    '''
+    Stores the pending events of a scheduler.EventScheduler as four arrays: the day and the type of each group of events,
+    the number of IDs of each group and all the IDs.
+    '''
+    groups = list(events.Events())
+    IDs = [people for day, eventType, people in groups]
+    return {"events.days": np.array([day for day, eventType, people in groups], dtype=np.int64),
+            "events.types": np.array([eventType for day, eventType, people in groups], dtype=np.int8),
+            "events.counts": np.array([len(people) for people in IDs], dtype=np.int64),
+            "events.IDs": np.concatenate(IDs) if (len(IDs) > 0) else np.zeros(0, dtype=np.int32),
+            "events.start": np.array(events.start)}
+
+
+def UnpackEvents(data, events):
+    '''
+    Schedules the events stored by PackEvents.
+    '''
+    events.start = int(data["events.start"])
+    IDs = np.split(data["events.IDs"], np.cumsum(data["events.counts"])[:-1])
+    for day, eventType, people in zip(data["events.days"], data["events.types"], IDs):
+        events.Schedule(int(day), int(eventType), people)
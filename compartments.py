@@ -0,0 +1,193 @@
+import numpy as np
+
+# Compartment codes.
+SUSCEPTIBLE, INFECTIOUS, RECOVERED = 0, 1, 2
+STATE_CODES = {"S": SUSCEPTIBLE, "I": INFECTIOUS, "R": RECOVERED}
+
+
+class Compartments:
+    '''
+    Keeps track of the state (Susceptible/Infectious/Recovered) of every person.
+
+    state: State code of each person (indexed by the person's ID).
+    counts: Number of people in each state, updated on every change.
+    The IDs of the infectious people are kept in a dense array (infectious[:numberOfInfectious]) together with the
+    position of each person in it, so that a person can be inserted or removed in O(1) (removal swaps in the last entry).
+    changes: Log of the state changes, one (IDs, old states, new state) entry per Set/SetMany, read by the occupancy cache
+             to keep the number of Susceptible and Infectious visitors of each location up to date (see occupancy.OccupancyCache).
+             changesStart is the number of entries removed from the front of the log (see TrimChanges).
+    '''
+
+    def __init__(self, size):
+        self.size = size
+        self.state = np.full(size, SUSCEPTIBLE, dtype=np.int8)
+        self.counts = [size, 0, 0]
+
+        self.infectious = np.zeros(size, dtype=np.int32)
+        self.position = np.full(size, -1, dtype=np.int32) # Position of each person in "infectious" (-1 if not infectious).
+        self.numberOfInfectious = 0
+
+        self.changes = []
+        self.changesStart = 0
+
+
+    def Count(self, state):
+        return self.counts[state]
+
+
+    def Percentage(self, state):
+        '''
+        Returns the percentage of people with the given state code.
+        '''
+        return round(self.counts[state]/self.size*100, 2)
+
+
+    def Infectious(self):
+        '''
+        Returns the IDs of the infectious people (view of the index, valid until the next change).
+        '''
+        return self.infectious[:self.numberOfInfectious]
+
+
+    def People(self, state):
+        '''
+        Returns the IDs of the people with the given state code.
+        '''
+        if (state == INFECTIOUS):
+            return self.Infectious().copy()
+        return np.flatnonzero(self.state == state)
+
+
+
+    def Restore(self, state, infectious):
+        '''
+        Sets the state of every person (e.g. from a checkpoint).
+
+        infectious: IDs of the infectious people, in the order of the index.
+        '''
+        self.state[:] = state
+        self.counts = [int(count) for count in np.bincount(self.state, minlength=3)]
+        self.numberOfInfectious = len(infectious)
+        self.infectious[:self.numberOfInfectious] = infectious
+        self.position[:] = -1
+        self.position[infectious] = np.arange(self.numberOfInfectious, dtype=np.int32)
+        self.changesStart += len(self.changes) + 1 # Readers of the log count the visitors again.
+        self.changes = []
+
+
+
+    def Copy(self):
+        '''
+        Returns an independent copy (see Model.Fork).
+        '''
+        compartments = Compartments.__new__(Compartments)
+        compartments.size = self.size
+        compartments.state = self.state.copy()
+        compartments.counts = list(self.counts)
+        compartments.infectious = self.infectious.copy()
+        compartments.position = self.position.copy()
+        compartments.numberOfInfectious = self.numberOfInfectious
+        compartments.changes = list(self.changes)
+        compartments.changesStart = self.changesStart
+        return compartments
+
+
+
+    def Version(self):
+        '''
+        Returns the number of state changes logged so far (see ChangesSince).
+        '''
+        return self.changesStart + len(self.changes)
+
+
+    def ChangesSince(self, version):
+        '''
+        Returns the changes logged after the given version as three arrays (IDs, old states, new states),
+        or None if some of them have been removed from the log.
+        '''
+        if (version < self.changesStart):
+            return None
+        changes = self.changes[version - self.changesStart:]
+        if (len(changes) == 0):
+            return np.zeros(0, dtype=np.int32), np.zeros(0, dtype=np.int8), np.zeros(0, dtype=np.int8)
+        IDs, oldStates, states = [], [], []
+        for people, oldState, state in changes:
+            people = np.atleast_1d(people)
+            IDs.append(people)
+            oldStates.append(np.broadcast_to(oldState, len(people)))
+            states.append(np.full(len(people), state, dtype=np.int8))
+        return np.concatenate(IDs), np.concatenate(oldStates), np.concatenate(states)
+
+
+    def TrimChanges(self, version):
+        '''
+        Removes the changes logged before the given version (once every reader has seen them).
+        '''
+        if (version > self.changesStart):
+            del self.changes[:version - self.changesStart]
+            self.changesStart = version
+
+
+
+
+    def Set(self, ID, state):
+        '''
+        Changes the state of a single person.
+        '''
+        oldState = self.state[ID]
+        if (oldState == state):
+            return
+        self.state[ID] = state
+        self.changes.append((ID, oldState, state))
+        self.counts[oldState] -= 1
+        self.counts[state] += 1
+
+        if (oldState == INFECTIOUS): # Move the last infectious person to the removed person's position.
+            self.numberOfInfectious -= 1
+            position = self.position[ID]
+            last = self.infectious[self.numberOfInfectious]
+            self.infectious[position] = last
+            self.position[last] = position
+            self.position[ID] = -1
+        elif (state == INFECTIOUS):
+            self.infectious[self.numberOfInfectious] = ID
+            self.position[ID] = self.numberOfInfectious
+            self.numberOfInfectious += 1
+
+
+    def SetMany(self, IDs, state):
+        '''
+        Changes the state of the given people (array of distinct IDs) in one batch.
+        '''
+        oldStates = self.state[IDs]
+        IDs = IDs[oldStates != state]
+        oldStates = oldStates[oldStates != state]
+        if (len(IDs) == 0):
+            return
+
+        self.state[IDs] = state
+        self.changes.append((IDs, oldStates, state))
+        for oldState, count in enumerate(np.bincount(oldStates, minlength=3)):
+            self.counts[oldState] -= int(count)
+        self.counts[state] += len(IDs)
+
+        if (state == INFECTIOUS):
+            end = self.numberOfInfectious + len(IDs)
+            self.infectious[self.numberOfInfectious:end] = IDs
+            self.position[IDs] = np.arange(self.numberOfInfectious, end)
+            self.numberOfInfectious = end
+            return
+
+        # Removal: the infectious people left at the end of the index fill the positions freed before the new end.
+        removed = IDs[oldStates == INFECTIOUS]
+        if (len(removed) == 0):
+            return
+        end = self.numberOfInfectious - len(removed)
+        freed = self.position[removed]
+        holes = np.sort(freed[freed < end])
+        tail = self.infectious[end:self.numberOfInfectious]
+        movers = tail[self.state[tail] == INFECTIOUS]
+        self.infectious[holes] = movers
+        self.position[movers] = holes
+        self.position[removed] = -1
+        self.numberOfInfectious = end
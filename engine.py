@@ -0,0 +1,314 @@
+import importlib.util
+import numpy as np
+from town import HOSPITAL
+from progressbar import printProgressBar
+from compartments import SUSCEPTIBLE
+from occupancy import OccupancyCache
+from recorder import OTHER
+
+
+class VectorizedEngine:
+    '''
+    Array-based implementation of the simulation loop (Model.RunSimulation).
+
+    Instead of moving "Person" objects between the locations' visitor lists, every hour is computed on integer arrays:
+    each person gets a flat location index, people are grouped by location with argsort/bincount, and the transmission
+    chances of all interactions of the hour are drawn in a single batch.
+    The rules (interactions, masks, capacities, hospitalization, Emergency Levels) are the same as in the "Person"-based loop.
+
+    model: The "Model" whose town and population are simulated. The results are written back to it.
+    '''
+
+    def __init__(self, model):
+        self.model = model
+        population = model.population
+        self.population = population
+
+        self.numberOfPeople = len(population)
+        self.daysOfInfection = model.daysOfInfection
+        self.rng = model.rng # Every random number is drawn from the model's Generator, in batches.
+
+        # Backend of the hourly contacts: the compiled kernel (see kernels.ContactKernel) or the NumPy implementation of Hour.
+        # Numba is only imported for the kernel (loading it takes a few hundred ms), so the NumPy backend starts without it.
+        if (model.backend not in ("auto", "numba", "numpy")):
+            raise ValueError("Unknown backend \"" + str(model.backend) + "\" (choose from auto, numba, numpy).")
+        self.useKernel = (model.backend == "numba") or (model.backend == "auto" and importlib.util.find_spec("numba") is not None)
+        self.contactKernel = None
+        if (self.useKernel):
+            from kernels import ContactKernel, NUMBA_AVAILABLE
+            if (not NUMBA_AVAILABLE):
+                raise ImportError("The \"numba\" backend requires Numba to be installed.")
+            self.contactKernel = ContactKernel
+
+        # Flat location indexing: locations of the same kind are stored consecutively, in the order of "town.locations".
+        self.locationCounts = np.array(model.town.LocationCounts())
+        self.offsets = np.concatenate(([0], np.cumsum(self.locationCounts)[:-1]))
+        self.numberOfLocations = int(self.locationCounts.sum())
+        self.occupancy = OccupancyCache(population, self.offsets, self.numberOfLocations, model.compartments)
+
+        # Personal characteristics are read from the population's columns (the routines too, see Hour).
+        self.isHospitalized = population.isHospitalized
+        self.transmission = model.transmission # Coefficients of the interactions (see transmission.Transmission).
+
+        self.compartments = model.compartments
+        self.state = model.compartments.state
+        self.hospitalOccupancy = 0 # Hospital visitors during the last hour of the day.
+
+        self.emergencyLevel = 0
+        self.currentDay = 0
+
+
+
+    def Fork(self, model):
+        '''
+        Returns an engine for a copy of the model (see Model.Fork) that continues from this engine's state.
+        The cached occupancy is shared (see occupancy.Occupancy.Copy).
+        '''
+        engine = VectorizedEngine(model)
+        engine.occupancy.entries = {key: occupancy.Copy() for key, occupancy in self.occupancy.entries.items()}
+        engine.occupancy.blocks = self.occupancy.blocks # Computed from routines that do not change.
+        engine.occupancy.demand = self.occupancy.demand
+        engine.hospitalOccupancy = self.hospitalOccupancy
+        engine.emergencyLevel = self.emergencyLevel
+        engine.currentDay = self.currentDay
+        return engine
+
+
+
+    def Percentage(self, state):
+        return self.compartments.Percentage(state)
+
+
+
+    def Infect(self, people, locations=OTHER, source=None):
+        '''
+        Infects the given people (array of IDs) on the engine's current day (see Model.InfectPeople).
+        '''
+        self.model.InfectPeople(people, self.currentDay, locations, source)
+
+
+
+    def Hour(self, hour):
+        '''
+        Simulates the interactions of the infectious people with the other people in their location for the given hour.
+        The locations' visitors come from the occupancy cache (see occupancy.OccupancyCache).
+
+        With the "blocks" stepping mode (see Model), each location is processed once for each block of hours with the same visitors
+        (see occupancy.OccupancyCache.Blocks): an infectious person makes the contacts of all the block's hours with distinct people
+        (as many as there are), and if there are more contacts than people, each contact counts as several interactions.
+        '''
+        level = self.emergencyLevel
+        occupancy = self.occupancy.Get(hour, level)
+        visitors = occupancy.visitors
+        self.hospitalOccupancy = visitors[self.offsets[HOSPITAL]]
+
+        infected = self.compartments.Infectious().copy()
+        if (len(infected) == 0):
+            return
+
+        # Each infectious person interacts with other people at the location of their routine (see Model.PeopleInteractions).
+        # Only the active locations need any work: the ones with Susceptible visitors (the infectious people's own locations have an Infectious one).
+        routineType, infectedLocation = self.occupancy.Locations(hour, infected)
+        isActive = occupancy.susceptible[infectedLocation] > 0
+        if (self.model.stepping == "blocks"): # Locations in the middle of a block were processed at its first hour.
+            hours = self.occupancy.Blocks(level)[hour][infectedLocation]
+            isActive &= hours > 0
+        if (not isActive.all()):
+            infected = infected[isActive]
+            routineType = routineType[isActive]
+            infectedLocation = infectedLocation[isActive]
+        isPresent = occupancy.Location(infected) == infectedLocation
+        others = visitors[infectedLocation] - isPresent
+
+        transmission = self.transmission
+        if (self.model.stepping == "blocks"):
+            contacts = self.BlockContacts(infected, hour, hours[isActive], others)
+        else:
+            contacts = np.minimum(transmission.numberOfInteractions[infected, hour], others)
+        numberOfInteractions = np.minimum(contacts, others)
+        repeats = contacts / np.maximum(numberOfInteractions, 1) # Interactions per contact (1 except in long blocks of small locations).
+
+        if (self.model.transmissionMode == "aggregate"):
+            self.AggregateTransmission(occupancy, hour, infected, routineType, infectedLocation, contacts, others)
+            return
+
+        total = int(numberOfInteractions.sum())
+        if (total == 0):
+            return
+
+        if (self.useKernel):
+            newlyInfected, infectors = self.contactKernel(infected, infectedLocation, isPresent, numberOfInteractions, occupancy.starts, visitors, occupancy.order,
+                                                          occupancy.position, self.state, transmission.transmissionBase, transmission.hygieneFactor,
+                                                  transmission.obedience, transmission.maskRequired[routineType], repeats, self.rng.random(4 * total))
+            if (len(newlyInfected) > 0):
+                newlyInfected, first = np.unique(newlyInfected, return_index=True) # The first contact that infected each person.
+                self.InfectAt(occupancy, newlyInfected, infectors[first], hour)
+            return
+
+        # Choose the other people: position of each contact among the other visitors of the location.
+        owner = np.repeat(np.arange(len(infected)), numberOfInteractions)
+        interactsWithAll = (numberOfInteractions == others)[owner]
+        slot = np.arange(total) - np.repeat(np.cumsum(numberOfInteractions) - numberOfInteractions, numberOfInteractions)
+        position = np.where(interactsWithAll, slot, 0)
+        sampled = np.flatnonzero(~interactsWithAll)
+        self.SampleWithoutReplacement(position, sampled, owner, others, numberOfInteractions)
+
+        starts = occupancy.starts[infectedLocation]
+        selfPosition = occupancy.position[infected] - starts
+        position += isPresent[owner] & (position >= selfPosition[owner]) # Skip the infectious person itself.
+        contacts = occupancy.order[starts[owner] + position]
+
+        # Only interactions with Susceptible people can lead to a transmission (see Model.Interaction).
+        susceptible = self.state[contacts] == SUSCEPTIBLE
+        owner = owner[susceptible]
+        contacts = contacts[susceptible]
+        spreaders = infected[owner]
+
+        transmissionChance = transmission.transmissionBase[spreaders] * transmission.hygieneFactor[contacts]
+
+        if (level > 0): # For each person wearing a mask, the transmission chance is reduced by 80%.
+            maskRequired = transmission.maskRequired[routineType[owner]]
+            transmissionChance[maskRequired & (self.rng.random(len(contacts)) <= transmission.obedience[spreaders])] *= 0.2
+            transmissionChance[maskRequired & (self.rng.random(len(contacts)) <= transmission.obedience[contacts])] *= 0.2
+
+        if (self.model.stepping == "blocks"): # Chance of at least one transmission in "repeats" interactions.
+            transmissionChance = -np.expm1(repeats[owner] * np.log1p(-transmissionChance))
+
+        isInfected = self.rng.random(len(contacts)) <= transmissionChance
+        newlyInfected, first = np.unique(contacts[isInfected], return_index=True) # The first contact that infected each person.
+        if (len(newlyInfected) > 0):
+            self.InfectAt(occupancy, newlyInfected, spreaders[isInfected][first], hour)
+
+
+    def AggregateTransmission(self, occupancy, hour, infected, routineType, infectedLocation, numberOfInteractions, others):
+        '''
+        Transmission mode "aggregate" (see Model): instead of sampling the contacts of each infectious person, the infections
+        of the hour are drawn from the hazard of each location, in O(visitors) of the locations with infectious people.
+
+        An infectious person with k interactions among the n other visitors of their location meets each of them with chance k/n,
+        so each Susceptible visitor s of location L is infected with chance 1 - exp(-h), where
+            h = hygieneFactor[s] * mask(s) * sum over the infectious people i of L of (k_i / n_i * transmissionBase[i] * mask(i))
+        and mask() is the average mask factor where masks are mandatory (see Transmission.MaskFactor).
+        The expected number of infections is the same as with the sampled contacts, up to the (small) chance of being infected twice.
+        The infectors are only chosen for the infection log (see infectionlog.InfectionLog.ChooseInfectors).
+        '''
+        transmission = self.transmission
+        infectivity = transmission.transmissionBase[infected] * numberOfInteractions / np.maximum(others, 1)
+        maskRequired = transmission.maskRequired[routineType]
+        infectivity[maskRequired] *= transmission.MaskFactor(infected[maskRequired])
+        pressure = np.bincount(infectedLocation, weights=infectivity, minlength=self.numberOfLocations)
+
+        # Visitors of the locations with infectious people.
+        locations = np.flatnonzero(pressure > 0)
+        if (len(locations) == 0):
+            return
+        counts = occupancy.visitors[locations]
+        location = np.repeat(locations, counts)
+        index = np.arange(len(location)) - np.repeat(np.cumsum(counts) - counts, counts) + np.repeat(occupancy.starts[locations], counts)
+        visitors = occupancy.order[index]
+
+        susceptible = self.state[visitors] == SUSCEPTIBLE
+        visitors = visitors[susceptible]
+        location = location[susceptible]
+
+        hazard = pressure[location] * transmission.hygieneFactor[visitors]
+        maskRequired = transmission.maskRequired[np.searchsorted(self.offsets, location, side="right") - 1]
+        hazard[maskRequired] *= transmission.MaskFactor(visitors[maskRequired])
+
+        isInfected = self.rng.random(len(visitors)) < -np.expm1(-hazard)
+        if (isInfected.any()):
+            infectors = -1
+            if (self.model.infectionLog is not None):
+                infectors = infected[self.model.infectionLog.ChooseInfectors(infectedLocation, infectivity, location[isInfected])]
+            self.InfectAt(occupancy, visitors[isInfected], infectors, hour)
+
+
+    def InfectAt(self, occupancy, people, infectors, hour):
+        '''
+        Infects the given people, who were infected by the given infectors during the given hour, at the location where they are
+        placed in the given occupancy.
+        '''
+        location = occupancy.Location(people)
+        codes = np.searchsorted(self.offsets, location, side="right") - 1
+        self.Infect(people, codes, (hour, infectors, location - self.offsets[codes]))
+
+
+    def BlockContacts(self, infected, hour, hours, others):
+        '''
+        Returns the number of interactions of each infectious person during the block of "hours" hours that starts at the given hour,
+        with at most "others" interactions per hour (see Model.PeopleInteractions).
+        '''
+        window = self.transmission.numberOfInteractions[infected, hour:hour + int(hours.max(initial=1))]
+        inBlock = np.arange(window.shape[1]) < hours[:, None]
+        return (np.minimum(window, others[:, None]) * inBlock).sum(axis=1)
+
+
+    def SampleWithoutReplacement(self, position, sampled, owner, others, numberOfInteractions):
+        '''
+        Draws a random position for each sampled interaction so that the positions of the same infectious person are distinct.
+        Duplicates are redrawn until none remain, which yields a uniformly random subset for each person.
+        Only the interactions of people that may still have duplicates are checked again (people with a single interaction never do).
+        '''
+        remaining = sampled
+        checked = sampled[numberOfInteractions[owner[sampled]] > 1]
+        while (len(remaining) > 0):
+            position[remaining] = (self.rng.random(len(remaining)) * others[owner[remaining]]).astype(np.int64)
+
+            key = owner[checked] * self.numberOfPeople + position[checked]
+            order = np.argsort(key, kind="stable")
+            sortedKey = key[order]
+            duplicate = np.zeros(len(checked), dtype=bool)
+            duplicate[order[1:][sortedKey[1:] == sortedKey[:-1]]] = True # Every occurrence of a position except the first.
+            remaining = checked[duplicate]
+
+            hasDuplicates = np.zeros(len(others), dtype=bool)
+            hasDuplicates[owner[remaining]] = True
+            checked = checked[hasDuplicates[owner[checked]]]
+
+
+
+    def RunSimulation(self, days):
+        '''
+        Runs the simulation until the given day (see Model.RunSimulation). The starting infectious people are infected on the first call.
+        '''
+        if (self.model.recorder.numberOfDays == 0):
+            # At the beginning, infect x random people (Where x = startingInfectiousPopulation)...
+            self.Infect(self.rng.choice(self.numberOfPeople, self.model.startingInfectiousPopulation, replace=False))
+
+            self.model.RecordDay(0, 0, self.occupancy) # Day 0 counts
+            self.model.WriteDay(0)
+
+        while (self.currentDay < days): # Days loop
+            self.currentDay += 1
+            if (not self.model.headless):
+                printProgressBar(self.currentDay, self.model.daysOfSimulation, prefix = 'Running Simulation...', length = 50) # Update the progress bar.
+
+            self.emergencyLevel = self.model.UpdateEmergencyLevel(self.emergencyLevel)
+            self.model.RecordDay(self.currentDay, self.emergencyLevel, self.occupancy) # Counts at the start of the day.
+            imported = self.model.TakeImportedInfections() # Infections from other towns (see Model.ImportInfections).
+            if (len(imported) > 0):
+                self.Infect(imported)
+
+            newlyInfected = self.model.StratifiedInfections(self.emergencyLevel) # Hybrid mode (see Model.hybridThreshold).
+            if (newlyInfected is not None):
+                people, locations, infectors, locationIDs = newlyInfected
+                if (len(people) > 0):
+                    self.Infect(people, locations, (-1, infectors, locationIDs))
+                self.hospitalOccupancy = self.model.stratifiedDay.HospitalVisitors(self.population)
+            else:
+                for hour in self.model.SimulatedHours(self.occupancy, self.emergencyLevel): # Hours loop
+                    self.Hour(hour)
+
+            self.model.ExecEvents(self.currentDay, self.hospitalOccupancy)
+            self.model.WriteDay(self.currentDay)
+
+        self.WriteBack()
+
+
+    def WriteBack(self):
+        '''
+        Copies the final state of the simulation to the model (the results are written to the model's recorder directly).
+        '''
+        model = self.model
+        model.currentDay = self.currentDay
+        model.emergencyLevel = self.emergencyLevel
@@ -0,0 +1,174 @@
+'''
+Ensemble statistics of many replicates of the same Model, updated as each replicate finishes.
+Only running aggregates are kept (never the replicates' trajectories), so the memory does not grow with the number of replicates.
+
+Example:
+    ensemble = RunEnsemble(200, numberOfPpl=10000, daysOfSimulation=60, callback=lambda ensemble: print(ensemble.count))
+    summary = ensemble.Summary()
+'''
+
+import os
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+from sweep import RunReplicate
+from randomness import SpawnSeeds
+
+
+class RunningStatistics:
+    '''
+    Mean and variance of a stream of values (or of arrays with the same shape, element-wise), using Welford's algorithm.
+    '''
+
+    def __init__(self, shape=()):
+        self.count = 0
+        self.mean = np.zeros(shape)
+        self.M2 = np.zeros(shape) # Sum of squared differences from the mean.
+
+
+    def Add(self, values):
+        self.count += 1
+        delta = values - self.mean
+        self.mean = self.mean + delta / self.count
+        self.M2 = self.M2 + delta * (values - self.mean)
+
+
+    def Variance(self):
+        '''
+        Sample variance (0 until there are two values).
+        '''
+        if (self.count < 2):
+            return np.zeros_like(self.M2)
+        return self.M2 / (self.count - 1)
+
+
+    def StandardDeviation(self):
+        return np.sqrt(self.Variance())
+
+
+
+class QuantileSketch:
+    '''
+    Approximate quantiles of a stream of percentage arrays (one value per day), element-wise.
+    The values are counted in fixed bins of width "resolution" over [0, 100], so the quantiles are accurate to half a bin
+    and the memory depends only on the number of days and bins.
+    '''
+
+    def __init__(self, size, resolution=0.1):
+        self.resolution = resolution
+        self.numberOfBins = int(round(100 / resolution)) + 1
+        self.counts = np.zeros((size, self.numberOfBins), dtype=np.int64)
+        self.count = 0
+
+
+    def Add(self, values):
+        bins = np.clip(np.rint(np.asarray(values) / self.resolution).astype(np.int64), 0, self.numberOfBins - 1)
+        self.counts[np.arange(len(bins)), bins] += 1
+        self.count += 1
+
+
+    def Quantiles(self, quantiles):
+        '''
+        Returns a (len(quantiles), size) array: for each quantile, the value of every element (the center of the bin where the quantile falls).
+        '''
+        cumulative = np.cumsum(self.counts, axis=1)
+        result = np.zeros((len(quantiles), len(self.counts)))
+        for i, quantile in enumerate(quantiles):
+            rank = np.maximum(np.ceil(quantile * self.count), 1) # Number of values at or below the quantile.
+            result[i] = np.argmax(cumulative >= rank, axis=1) * self.resolution
+        return result
+
+
+
+class Ensemble:
+    '''
+    Streaming aggregates of the results of many replicates (see Model.Results).
+
+    S, I, R: Mean and variance of each day's percentages (RunningStatistics).
+    infectiousQuantiles: Quantile sketch of each day's infectious percentage.
+    peakDay, peakSize: Histograms of the day and size (whole percentage) of each replicate's infectious peak.
+    attackRate: Mean and variance of the percentage of people that were ever infected (100 - final Susceptible percentage, SIR only).
+    '''
+
+    QUANTILES = [0.05, 0.5, 0.95]
+
+    def __init__(self, days, resolution=0.1):
+        self.days = days
+        self.count = 0
+        self.S = RunningStatistics(days + 1)
+        self.I = RunningStatistics(days + 1)
+        self.R = RunningStatistics(days + 1)
+        self.infectiousQuantiles = QuantileSketch(days + 1, resolution)
+
+        self.peakDay = np.zeros(days + 1, dtype=np.int64)
+        self.peakSize = np.zeros(101, dtype=np.int64)
+        self.attackRate = RunningStatistics()
+
+
+    def Add(self, results):
+        '''
+        Adds the results of one replicate (the day 0 entry and one entry per simulated day).
+        '''
+        self.count += 1
+        self.S.Add(results["S"])
+        self.I.Add(results["I"])
+        self.R.Add(results["R"])
+        self.infectiousQuantiles.Add(results["I"])
+
+        peak = int(np.argmax(results["I"]))
+        self.peakDay[peak] += 1
+        self.peakSize[int(results["I"][peak])] += 1
+        self.attackRate.Add(100 - results["S"][-1])
+
+
+    def Summary(self):
+        '''
+        Returns the statistics of the replicates added so far.
+        '''
+        quantiles = self.infectiousQuantiles.Quantiles(self.QUANTILES)
+        return {
+            "replicates": self.count,
+            "days": np.arange(self.days + 1),
+            "meanI": self.I.mean, "sdI": self.I.StandardDeviation(),
+            "meanS": self.S.mean, "meanR": self.R.mean,
+            "q05I": quantiles[0], "q50I": quantiles[1], "q95I": quantiles[2],
+            "peakDayHistogram": self.peakDay.copy(), "peakSizeHistogram": self.peakSize.copy(),
+            "meanAttackRate": float(self.attackRate.mean), "sdAttackRate": float(self.attackRate.StandardDeviation()),
+        }
+
+
+
+def RunEnsemble(replicates, seed=0, workers=None, callback=None, resolution=0.1, **parameters):
+    '''
+    Runs "replicates" simulations with the same Model parameters on a pool of processes and returns their Ensemble.
+
+    seed: Seed of the ensemble (each replicate's seed is derived from it, see sweep.RunSweep).
+    callback: Called with the Ensemble after each replicate is added, so the statistics can be read before the ensemble finishes.
+    parameters: Model parameters (the engine is "vectorized" by default).
+    '''
+    parameters = {"engine": "vectorized", **parameters}
+    ensemble = Ensemble(parameters.get("daysOfSimulation", 7), resolution)
+    runSeeds = SpawnSeeds(seed, replicates)
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        maxPending = 2 * (workers or os.cpu_count() or 1) # Only a few replicates are submitted ahead, so finished results do not pile up.
+        pending = set()
+        for replicate in range(replicates):
+            pending.add(executor.submit(RunReplicate, (replicate, replicate, parameters, runSeeds[replicate])))
+            if (len(pending) >= maxPending):
+                pending = AddFinished(ensemble, pending, callback)
+        while (len(pending) > 0):
+            pending = AddFinished(ensemble, pending, callback)
+
+    return ensemble
+
+
+def AddFinished(ensemble, pending, callback):
+    '''
+    Waits for at least one of the pending replicates, adds the finished ones to the ensemble and returns the ones still pending.
+    '''
+    finished, pending = wait(pending, return_when=FIRST_COMPLETED)
+    for future in finished:
+        ensemble.Add(future.result()[3])
+        if (callback is not None):
+            callback(ensemble)
+    return pending
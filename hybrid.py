@@ -0,0 +1,101 @@
+'''
+Stratified daily update of the "hybrid" mode of Model (see the hybridThreshold parameter).
+
+With few infectious people, chance matters (which families and workplaces the disease reaches, whether it dies out), so the days are
+simulated hour by hour. In a big wave most of the hourly work goes to tens of thousands of infectious people whose individual contacts
+barely change the outcome, so while there are at least hybridThreshold infectious people, the infections of the whole day are drawn
+at once (tau-leaping with a step of one day), in O(population) work whatever the number of infectious people:
+- Outside their home, a Susceptible person of age group a is infected with the hazard of the mean-field contact matrices of the
+  current Emergency Level (every kind of location except houses, see meanfield.ContactMatrices) times the infectious fraction of each age group.
+- At home, the hazard comes from the infectious members of the person's own family, with their interactions at home for the day.
+
+The people stay agents during these days: the newly infected people are chosen individually and get their recovery and
+hospitalization events like in the hourly simulation, so the hourly simulation continues from their state when the wave recedes.
+'''
+
+import numpy as np
+from compartments import SUSCEPTIBLE
+from recorder import OTHER
+from meanfield import ContactMatrices
+from person import AGEGROUPS
+from routines import LEVEL_ROUTINES
+from transmission import MASK_LOCATIONS
+from town import HOUSE
+
+
+class StratifiedDay:
+    '''
+    Daily infection hazards of a town, computed once from its population and transmission coefficients (they do not change during
+    a simulation, so the object is shared with forks of the model that have the same r0 and days of infection).
+    '''
+
+    def __init__(self, population, transmission, daysOfInfection):
+        self.transmission = transmission
+        self.agegroup = population.agegroup
+        self.houseID = population.houseID
+        self.groupSize = np.maximum(np.bincount(population.agegroup, minlength=len(AGEGROUPS)), 1)
+        self.houseSize = np.bincount(population.houseID)
+        self.levelType = population.levelType
+
+        matrices = ContactMatrices(population, transmission, daysOfInfection)
+        self.outside = matrices.sum(axis=1) - matrices[:, HOUSE] # (4, G, G) daily hazards outside the home.
+        self.homeInfectivity = {} # Emergency Level: daily chance rate of each person to infect each member of their family.
+
+
+    def HomeInfectivity(self, level):
+        '''
+        Returns the daily transmission rate of each person to each other member of their family at the given Emergency Level:
+        their interactions at home during the day (at most one with each member per hour), spread evenly over the family.
+        '''
+        if (level not in self.homeInfectivity):
+            transmission = self.transmission
+            atHome = self.levelType[LEVEL_ROUTINES[level]] == HOUSE
+            others = np.maximum(self.houseSize[self.houseID] - 1, 1)
+            contacts = np.minimum(transmission.NumberOfInteractions(level), others[:, None]) * atHome
+            infectivity = transmission.transmissionBase * contacts.sum(axis=1) / others
+            if (MASK_LOCATIONS[level][HOUSE]):
+                infectivity *= transmission.MaskFactor(slice(None))
+            self.homeInfectivity[level] = infectivity
+        return self.homeInfectivity[level]
+
+
+    def Infections(self, compartments, population, level, rng, log=None):
+        '''
+        Returns the IDs of the people infected during a day at the given Emergency Level and, for each infection, the location code
+        (HOUSE, or recorder.OTHER for the infections outside the home, which are not assigned to a kind of location), the infector
+        and the location ID (-1 if unknown). The infector of an infection at home is only chosen if an infection log is given
+        (see infectionlog.InfectionLog.ChooseInfectors), among the infectious members of the family.
+        Hospitalized people are neither at home nor among the visitors of the other locations, so they do not infect anyone.
+        '''
+        infectious = compartments.Infectious()
+        infectious = infectious[~population.isHospitalized[infectious]]
+        susceptible = compartments.People(SUSCEPTIBLE)
+        susceptible = susceptible[~population.isHospitalized[susceptible]]
+
+        prevalence = np.bincount(self.agegroup[infectious], minlength=len(self.groupSize)) / self.groupSize
+        hazard = (self.outside[level] @ prevalence)[self.agegroup[susceptible]]
+
+        pressure = np.bincount(self.houseID[infectious], weights=self.HomeInfectivity(level)[infectious], minlength=len(self.houseSize))
+        homeHazard = pressure[self.houseID[susceptible]] * self.transmission.hygieneFactor[susceptible]
+        if (MASK_LOCATIONS[level][HOUSE]):
+            homeHazard *= self.transmission.MaskFactor(susceptible)
+
+        hazard += homeHazard
+        infected = rng.random(len(susceptible)) < -np.expm1(-hazard)
+        atHome = rng.random(np.count_nonzero(infected)) * hazard[infected] < homeHazard[infected] # Share of each infection's hazard.
+        people = susceptible[infected]
+
+        infectors = np.full(len(people), -1, dtype=np.int32)
+        locationIDs = np.where(atHome, self.houseID[people], -1)
+        if (log is not None and atHome.any()):
+            chosen = log.ChooseInfectors(self.houseID[infectious], self.HomeInfectivity(level)[infectious], self.houseID[people[atHome]])
+            infectors[atHome] = infectious[chosen]
+        return people, np.where(atHome, HOUSE, OTHER), infectors, locationIDs
+
+
+    @staticmethod
+    def HospitalVisitors(population):
+        '''
+        Returns the number of Hospital visitors during the last hour of the day (see Model.ExecEvents).
+        '''
+        return population.HospitalOccupancy()
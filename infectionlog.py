@@ -0,0 +1,156 @@
+'''
+Log of every infection of a simulation, for transmission-tree analysis (generation intervals, superspreading, where people are infected).
+
+Each infection is one record of EVENT_DTYPE: day, hour, infector ID, infectee ID, location code and location ID (index among the
+locations of that kind, e.g. the house ID). Infections without a known source have -1 in the fields that are unknown:
+- the starting infectious people and infections from other towns (see Model.ImportInfections): infector, hour and location;
+- infections outside the home on the days that are drawn at once (see Model.hybridThreshold): infector, hour and location
+  (location code recorder.OTHER). On those days the infections at home have the house but no hour.
+With the "aggregate" transmission mode the contacts are not sampled, so the infector of each infection is drawn among the
+infectious visitors of the location in proportion to their part of its hazard (with the log's own Generator, a child stream of
+the model's Generator, so the log does not change the simulation and a seed gives the same log, also when the run is continued
+from a checkpoint). With the "blocks" stepping mode, the hour is the first hour of the block.
+
+The records are written into a preallocated structured buffer. When it is full, it is appended to the log's file (or kept in
+memory as a chunk if the log has no file) and reused, so logging costs a few array writes per hour. The file is the raw array
+of records, without a header, so it can be read back without copying (see LoadInfectionLog). A run continued from a checkpoint can
+append to the same file: checkpoint.LoadCheckpoint truncates it to its size when the checkpoint was saved, so the infections of the
+days simulated after the checkpoint by the killed job are not recorded twice.
+
+Example:
+    with InfectionLog("infections.bin") as log:
+        model = Model(1000000, engine="vectorized", headless=True, infectionLog=log)
+        model.Run(120)
+    events = LoadInfectionLog("infections.bin") # Memory-mapped, e.g. events["infector"], events["day"].
+'''
+
+import os
+import numpy as np
+from randomness import CreateGenerator
+
+EVENT_DTYPE = np.dtype([("day", np.int32), ("hour", np.int8), ("infector", np.int32), ("infectee", np.int32),
+                        ("locationType", np.int8), ("locationID", np.int32)])
+
+
+def LoadInfectionLog(path):
+    '''
+    Returns the records of the log file as a read-only memory-mapped array of EVENT_DTYPE.
+    An incomplete last record (job killed while writing) is ignored.
+    '''
+    count = os.path.getsize(path) // EVENT_DTYPE.itemsize
+    if (count == 0):
+        return np.zeros(0, dtype=EVENT_DTYPE)
+    return np.memmap(path, dtype=EVENT_DTYPE, mode="r", shape=(count,))
+
+
+
+class InfectionLog:
+    '''
+    path: File the records are appended to (None keeps them in memory).
+    chunkSize: Number of records of the buffer.
+    seed: Seed of the Generator that chooses the infectors that are not sampled (see ChooseInfectors). By default, the model that
+          records infections in the log gives it a child stream of its own Generator.
+    '''
+
+    def __init__(self, path=None, chunkSize=65536, seed=None):
+        self.path = path
+        self.file = open(path, "ab") if (path is not None) else None
+        self.buffer = np.empty(chunkSize, dtype=EVENT_DTYPE)
+        self.size = 0 # Records in the buffer.
+        self.chunks = [] # Full buffers of a log without a file.
+        self.rng = CreateGenerator(seed) if (seed is not None) else None # Set by the model (see Model).
+
+
+    def Append(self, day, hour, infectors, infectees, locationTypes, locationIDs):
+        '''
+        Adds the records of the given infections. Every argument is an array with one entry per infectee, or one value for all of them.
+        '''
+        infectees = np.atleast_1d(infectees)
+        count = len(infectees)
+        if (self.size + count > len(self.buffer)):
+            self.Flush()
+            if (count > len(self.buffer)):
+                self.buffer = np.empty(count, dtype=EVENT_DTYPE)
+
+        records = self.buffer[self.size:self.size + count]
+        records["day"] = day
+        records["hour"] = hour
+        records["infector"] = infectors
+        records["infectee"] = infectees
+        records["locationType"] = locationTypes
+        records["locationID"] = locationIDs
+        self.size += count
+
+
+    def ChooseInfectors(self, groups, weights, infecteeGroups):
+        '''
+        Returns the infector of each infectee (index in "groups"): one of the infectious people of the same group (location or family),
+        chosen in proportion to their weights (their part of the group's hazard). Every infectee's group must have an infectious person.
+
+        groups, weights: Group and weight of each infectious person.
+        infecteeGroups: Group of each infectee.
+        '''
+        order = np.argsort(groups, kind="stable")
+        cumulative = np.cumsum(weights[order])
+        sortedGroups = groups[order]
+        first = np.searchsorted(sortedGroups, infecteeGroups, side="left")
+        last = np.searchsorted(sortedGroups, infecteeGroups, side="right")
+        before = np.where(first > 0, cumulative[first - 1], 0)
+        target = before + self.rng.random(len(infecteeGroups)) * (cumulative[last - 1] - before)
+        index = np.minimum(np.searchsorted(cumulative, target, side="right"), last - 1)
+        return order[index]
+
+
+    def Flush(self):
+        '''
+        Appends the buffered records to the file (or to the chunks in memory).
+        '''
+        if (self.size > 0):
+            if (self.file is not None):
+                self.buffer[:self.size].tofile(self.file)
+            else:
+                self.chunks.append(self.buffer[:self.size].copy())
+            self.size = 0
+        if (self.file is not None):
+            self.file.flush()
+
+
+    def Position(self):
+        '''
+        Returns the size of the log's file in bytes after flushing the buffer (None if the log has no file).
+        '''
+        self.Flush()
+        return self.file.tell() if (self.file is not None) else None
+
+
+    def Truncate(self, position):
+        '''
+        Drops the records written after the given Position (see checkpoint.LoadCheckpoint).
+        '''
+        self.Flush()
+        self.file.truncate(position)
+        self.file.seek(position)
+
+
+    def Events(self):
+        '''
+        Returns all the records so far (memory-mapped from the file if the log has one).
+        '''
+        self.Flush()
+        if (self.path is not None):
+            return LoadInfectionLog(self.path)
+        return np.concatenate(self.chunks) if (len(self.chunks) > 0) else np.zeros(0, dtype=EVENT_DTYPE)
+
+
+    def Close(self):
+        self.Flush()
+        if (self.file is not None):
+            self.file.close()
+
+
+    def __enter__(self):
+        return self
+
+
+    def __exit__(self, excType, excValue, traceback):
+        self.Close()
@@ -0,0 +1,89 @@
+'''
+Compiled kernels of the vectorized engine (see engine.VectorizedEngine.Hour).
+
+Numba is optional. If it is installed, the contacts and transmissions of each hour are computed by a JIT-compiled loop over
+the flat arrays of the occupancy (compiled on first use and cached on disk), otherwise the engine uses its NumPy implementation.
+Both backends draw their random numbers from the model's Generator, so a seed gives the same results on every run of a backend.
+'''
+
+import numpy as np
+from compartments import SUSCEPTIBLE
+
+try:
+    import numba
+except ImportError:
+    numba = None
+
+NUMBA_AVAILABLE = numba is not None
+
+
+def Jit(function):
+    '''
+    Compiles the function with Numba if it is installed (otherwise it stays a plain Python function).
+    '''
+    if (numba is None):
+        return function
+    return numba.njit(cache=True, nogil=True)(function)
+
+
+@Jit
+def ContactKernel(infected, infectedLocation, isPresent, numberOfInteractions, starts, visitors, order, position, state,
+                  transmissionBase, hygieneFactor, obedience, maskRequired, repeats, random):
+    '''
+    Each infectious person interacts with numberOfInteractions[i] distinct other visitors of their location (chosen with Floyd's
+    algorithm) and may infect the Susceptible ones, with the same chances as Model.Interaction.
+
+    infected, infectedLocation, isPresent: IDs of the infectious people, flat index of their routine's location and whether they
+                                           are placed there (see occupancy.Occupancy for starts, visitors, order and position).
+    maskRequired: Whether masks are mandatory at the location of each infectious person.
+    repeats: Number of interactions that each contact of an infectious person stands for (see the "blocks" stepping mode of Model).
+    random: 4 uniform numbers in [0, 1) for each interaction: position of the contact, the two masks and the transmission.
+
+    Returns the IDs of the infected people (a person infected by several contacts appears more than once) and of their infectors.
+    '''
+    newlyInfected = np.empty(len(random) // 4, dtype=np.int32)
+    infectors = np.empty(len(random) // 4, dtype=np.int32)
+    chosen = np.empty(64, dtype=np.int64)
+    count = 0
+    slot = 0
+    for i in range(len(infected)):
+        person = infected[i]
+        k = numberOfInteractions[i]
+        start = starts[infectedLocation[i]]
+        others = visitors[infectedLocation[i]] - isPresent[i]
+        selfPosition = position[person] - start
+        if (k > len(chosen)):
+            chosen = np.empty(2 * k, dtype=np.int64)
+
+        for m in range(k): # Floyd's algorithm: k distinct positions among the other visitors.
+            j = others - k + m
+            candidate = int(random[4 * (slot + m)] * (j + 1))
+            for q in range(m):
+                if (chosen[q] == candidate):
+                    candidate = j
+                    break
+            chosen[m] = candidate
+
+        for m in range(k):
+            contactPosition = chosen[m]
+            if (isPresent[i] and contactPosition >= selfPosition): # Skip the infectious person itself.
+                contactPosition += 1
+            contact = order[start + contactPosition]
+            if (state[contact] != SUSCEPTIBLE):
+                continue
+
+            transmissionChance = transmissionBase[person] * hygieneFactor[contact]
+            if (maskRequired[i]): # For each person wearing a mask, the transmission chance is reduced by 80%.
+                if (random[4 * (slot + m) + 1] <= obedience[person]):
+                    transmissionChance *= 0.2
+                if (random[4 * (slot + m) + 2] <= obedience[contact]):
+                    transmissionChance *= 0.2
+            if (repeats[i] > 1): # Chance of at least one transmission.
+                transmissionChance = 1 - (1 - transmissionChance) ** repeats[i]
+            if (random[4 * (slot + m) + 3] <= transmissionChance):
+                newlyInfected[count] = contact
+                infectors[count] = person
+                count += 1
+        slot += k
+
+    return newlyInfected[:count], infectors[:count]
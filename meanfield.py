@@ -0,0 +1,162 @@
+'''
+Deterministic mean-field approximation of a Model, for quick approximate curves (e.g. "what if" questions in an interactive session).
+
+The population is grouped by age group. For every Emergency Level, hour and kind of location, the town's routines give the people of
+each age group that are there, how many people they interact with (see Transmission.NumberOfInteractions), their chance to transmit
+(transmissionBase) and to be infected (hygieneFactor) and the effect of their masks where they are mandatory (Transmission.MaskFactor).
+Assuming that the interactions at each kind of location are spread evenly over the people there, these give the daily hazard of a
+Susceptible person of each age group from the Infectious people of each age group (see ContactMatrices).
+The days are then computed like in the agent model: the Emergency Level is set at the start of the day (same thresholds, see
+Model.NextEmergencyLevel), the new infections of the day follow from the hazard, and people recover daysOfInfection + 1 days after their infection.
+
+Families are small, so the disease cannot spread from house to house: the infections at home are only caused by the people that
+were infected outside (they are tracked separately). Hospitalizations and the capacity of the locations are ignored.
+
+Example:
+    model = Model(100000, r0=2.0, headless=True, seed=1)
+    meanField = MeanField(model)
+    results = meanField.Run(120) # Same format as model.Run(120).
+    results = meanField.Run(120, r0=1.5, emergencyThresholds=[2, 5, 10]) # What if...
+'''
+
+import numpy as np
+from model import Model
+from person import AGEGROUPS
+from routines import LEVEL_ROUTINES
+from transmission import MASK_LOCATIONS
+from town import HOUSE, HOSPITAL
+
+
+def ContactMatrices(population, transmission, daysOfInfection, scale=1):
+    '''
+    Returns a (4, C, G, G) array (C: number of location codes, G: number of age groups). Element [level, code, a, b] is the daily hazard
+    of a Susceptible person of age group a at locations of that kind, at that Emergency Level, if every person of age group b was
+    Infectious (it is multiplied by the Infectious fraction of group b).
+
+    People meet the same few people at their home, school or workplace every day, so part of their interactions during the infectious
+    period are with people they have already infected. The infectivity of each person at each location is reduced by the factor
+    (1 - exp(-x)) / x, where x is the expected number of transmissions to each other visitor of the location during the infectious period
+    (daysOfInfection days and, on average, half of the day of infection).
+
+    scale: Factor of the transmission chances (e.g. for a different r0, see MeanField.Run).
+    '''
+    groups = len(AGEGROUPS)
+    codes = len(MASK_LOCATIONS[0])
+    size = len(population)
+    groupSize = np.maximum(np.bincount(population.agegroup, minlength=groups), 1)
+    maskFactor = transmission.MaskFactor(slice(None))
+    transmissionBase = transmission.transmissionBase * scale
+    offsets = np.concatenate(([0], np.cumsum(population.town.LocationCounts())[:-1]))
+
+    matrices = np.zeros((4, codes, groups, groups))
+    for level in range(4):
+        routineType = population.levelType[LEVEL_ROUTINES[level]]
+        location = offsets[routineType] + np.where(routineType == HOUSE, population.houseID[:, None], np.where(routineType == HOSPITAL, 0, population.defaultID))
+        numberOfInteractions = transmission.NumberOfInteractions(level)
+        maskRequired = MASK_LOCATIONS[level][routineType]
+        masks = np.where(maskRequired, maskFactor[:, None], 1) # (N, 24) factor of each person's mask.
+        key = population.agegroup[:, None].astype(np.int64) * codes + routineType # Age group and kind of location of each person and hour.
+
+        # Expected transmissions from each person to each other visitor of their location, summed over the hours they spend there.
+        others = np.stack([np.bincount(location[:, hour])[location[:, hour]] for hour in range(24)], axis=1) - 1
+        # The other visitor's hygiene and mask (where masks are mandatory) are replaced by the town's averages.
+        otherMasks = np.where(maskRequired, maskFactor.mean(), 1)
+        pairHazard = numberOfInteractions / np.maximum(others, 1) * (transmissionBase * transmission.hygieneFactor.mean())[:, None] * masks * otherMasks
+        visit, index = np.unique(np.arange(size)[:, None] * int(location.max() + 1) + location, return_inverse=True)
+        x = np.bincount(index.ravel(), weights=pairHazard.ravel())[index.reshape(size, 24)] * (daysOfInfection + 0.5)
+        repeated = np.where(x > 0, -np.expm1(-x) / np.maximum(x, 1e-12), 1)
+
+        for hour in range(24):
+            visitors = np.bincount(routineType[:, hour], minlength=codes)
+            # Chance to be infected (per interaction) and to infect (per hour) of the people of each age group at each kind of location.
+            susceptibility = np.bincount(key[:, hour], weights=transmission.hygieneFactor * masks[:, hour], minlength=groups*codes).reshape(groups, codes)
+            infectivity = np.bincount(key[:, hour], weights=transmissionBase * numberOfInteractions[:, hour] * masks[:, hour] * repeated[:, hour], minlength=groups*codes).reshape(groups, codes)
+            matrices[level] += np.einsum("ac,bc->cab", susceptibility / groupSize[:, None] / np.maximum(visitors, 1), infectivity)
+    return matrices
+
+
+
+class MeanField:
+    '''
+    Mean-field approximation of the given (built) Model. The contact matrices are computed once for each r0 and daysOfInfection
+    (see ContactMatrices), after that each Run takes a few milliseconds.
+    '''
+
+    def __init__(self, model):
+        self.numberOfPpl = model.numberOfPpl
+        self.startingInfectiousPercentage = model.startingInfectiousPercentage
+        self.daysOfInfection = model.daysOfInfection
+        self.r0 = model.r0
+        self.modelType = model.modelType
+        self.emergencyThresholds = model.emergencyThresholds
+
+        self.population = model.population
+        self.transmission = model.transmission
+        self.groupSize = np.bincount(model.population.agegroup, minlength=len(AGEGROUPS)).astype(np.float64)
+        self.matrices = {} # (r0, daysOfInfection): contact matrices.
+        self.Matrices(self.r0, self.daysOfInfection)
+
+
+    def Matrices(self, r0, daysOfInfection):
+        '''
+        Returns the contact matrices for the given r0 and days of infection (computed on first use).
+        The chances of transmission are proportional to r0 / daysOfInfection (see transmission.Transmission).
+        '''
+        if ((r0, daysOfInfection) not in self.matrices):
+            scale = (r0 / self.r0) * (self.daysOfInfection / daysOfInfection)
+            self.matrices[(r0, daysOfInfection)] = ContactMatrices(self.population, self.transmission, daysOfInfection, scale)
+        return self.matrices[(r0, daysOfInfection)]
+
+
+    def Run(self, days, **changes):
+        '''
+        Returns the results of the given number of days, in the format of Model.Results (percentages are not rounded).
+
+        changes: Parameters that are different from the model's: r0, daysOfInfection, modelType, emergencyThresholds, startingInfectiousPercentage.
+                 A new r0 or daysOfInfection needs new contact matrices (see Matrices), the first run with them takes longer.
+        '''
+        unsupported = set(changes) - {"r0", "daysOfInfection", "modelType", "emergencyThresholds", "startingInfectiousPercentage"}
+        if (len(unsupported) > 0):
+            raise ValueError("Cannot change " + ", ".join(sorted(unsupported)) + " in a mean-field run.")
+        r0 = changes.get("r0", self.r0)
+        daysOfInfection = changes.get("daysOfInfection", self.daysOfInfection)
+        modelType = changes.get("modelType", self.modelType)
+        thresholds = changes.get("emergencyThresholds", self.emergencyThresholds)
+        startingInfectiousPercentage = changes.get("startingInfectiousPercentage", self.startingInfectiousPercentage)
+        matrices = self.Matrices(r0, daysOfInfection)
+        home = matrices[:, HOUSE]
+        outside = matrices.sum(axis=1) - home
+
+        # Day 0: the starting infectious people are chosen at random, so they are spread over the age groups like the population.
+        size = self.groupSize
+        infections = np.zeros((days + 1, 2, len(size))) # New infections of each day, outside (0) and at home (1), per age group.
+        infections[0, 0] = round(self.numberOfPpl * startingInfectiousPercentage / 100) * size / size.sum()
+        S = size - infections[0, 0]
+        I = infections[0].copy() # Infectious people that were infected outside and at home.
+        R = np.zeros(len(size))
+
+        counts = np.zeros((days + 1, 3))
+        levels = np.zeros(days + 1, dtype=np.int8)
+        counts[0] = S.sum(), I.sum(), R.sum()
+        level = 0
+        for day in range(1, days + 1):
+            level = Model.NextEmergencyLevel(round(I.sum() / self.numberOfPpl * 100, 2), level, thresholds)
+            levels[day] = level
+            counts[day] = S.sum(), I.sum(), R.sum()
+
+            # Everyone spreads the disease outside, but only the people infected outside bring it into a (susceptible) home.
+            hazard = np.stack((outside[level] @ (I.sum(axis=0) / np.maximum(size, 1)), home[level] @ (I[0] / np.maximum(size, 1))))
+            infections[day] = S * -np.expm1(-hazard.sum(axis=0)) * hazard / np.maximum(hazard.sum(axis=0), 1e-300)
+            S -= infections[day].sum(axis=0)
+            I += infections[day]
+
+            if (day > daysOfInfection): # Recovery of the people infected daysOfInfection + 1 days ago.
+                recovered = infections[day - daysOfInfection - 1]
+                I -= recovered
+                if (modelType == "SIS"):
+                    S += recovered.sum(axis=0)
+                else:
+                    R += recovered.sum(axis=0)
+
+        percentages = counts / self.numberOfPpl * 100
+        return {"days": np.arange(days + 1), "S": percentages[:, 0], "I": percentages[:, 1], "R": percentages[:, 2], "emergencyLevels": levels}
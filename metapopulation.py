@@ -0,0 +1,162 @@
+'''
+Runs several towns as one region (metapopulation). Each town is a headless Model (own Town, population and Emergency Level)
+in its own worker process, and the towns are coupled through a mobility matrix at the end of every day.
+
+Commuters are not moved between the processes. Each worker sends a summary of its town (population and S/I/R counts),
+the main process turns the summaries into the probability that a Susceptible resident of each town gets infected outside
+the town during the next day, and each worker draws those infections in its own population (see Model.ImportInfections).
+Only a few numbers per town are exchanged per day, so the towns run in parallel for almost all of the wall time.
+
+Example:
+    towns = [{"numberOfPpl": 100000, "r0": 2.0}, {"numberOfPpl": 50000, "r0": 1.5, "startingInfectiousPercentage": 0}]
+    mobility = [[0, 0.05], [0.1, 0]] # 5% of the first town's residents commute to the second every day, 10% the other way.
+    with Metapopulation(towns, mobility, seed=1) as region:
+        results = region.Run(60)
+'''
+
+import multiprocessing
+import numpy as np
+from randomness import SpawnSeeds
+from compartments import SUSCEPTIBLE, INFECTIOUS, RECOVERED
+
+
+def TownWorker(connection, parameters, seed):
+    '''
+    Runs one town in a worker process. Commands received through the connection:
+    ("day", probability): infects each Susceptible resident with the given probability, runs one day and sends the town's summary.
+    ("results", None): sends the town's Model.Results.
+    ("stop", None): exits.
+    '''
+    from model import Model # Imported in the worker, the main process only exchanges summaries.
+    model = Model(**{"engine": "vectorized", **parameters, "daysOfSimulation": 0}, headless=True, seed=seed)
+    model.Run(0) # Day 0: starting infections.
+    connection.send(Summary(model))
+
+    while (True):
+        command, value = connection.recv()
+        if (command == "day"):
+            model.ImportInfections(value)
+            model.Run(1)
+            connection.send(Summary(model))
+        elif (command == "results"):
+            connection.send(model.Results())
+        else:
+            break
+    connection.close()
+
+
+def Summary(model):
+    '''
+    Returns the numbers a town shares with the others: population, S/I/R counts, r0, days of infection and Emergency Level.
+    '''
+    compartments = model.compartments
+    return (model.numberOfPpl, compartments.Count(SUSCEPTIBLE), compartments.Count(INFECTIOUS), compartments.Count(RECOVERED),
+            model.r0, model.daysOfInfection, model.emergencyLevel)
+
+
+
+class Metapopulation:
+    '''
+    A region of towns that exchange commuters.
+
+    towns: List with the Model parameters of each town (e.g. numberOfPpl, r0, modelType). The engine is "vectorized" by default.
+    mobility: Square matrix (list of lists or array), mobility[i][j] is the fraction of town i's residents that spend the day in town j.
+              The diagonal is ignored and each row (without the diagonal) must sum to at most 1.
+    seed: Seed of the region. Each town gets its own seed (see randomness.SpawnSeeds).
+
+    The workers are started by the constructor and stopped by Close (or at the end of a "with" block).
+    '''
+
+    def __init__(self, towns, mobility, seed=None):
+        self.numberOfTowns = len(towns)
+        self.mobility = np.array(mobility, dtype=np.float64)
+        if (self.mobility.shape != (self.numberOfTowns, self.numberOfTowns)):
+            raise ValueError("The mobility matrix must be " + str(self.numberOfTowns) + "x" + str(self.numberOfTowns) + ".")
+        np.fill_diagonal(self.mobility, 0)
+        if (np.any(self.mobility < 0) or np.any(self.mobility.sum(axis=1) > 1)):
+            raise ValueError("Mobility fractions must be non-negative and sum to at most 1 for each town.")
+
+        self.connections = []
+        self.processes = []
+        for parameters, townSeed in zip(towns, SpawnSeeds(seed, self.numberOfTowns)):
+            connection, workerConnection = multiprocessing.Pipe()
+            process = multiprocessing.Process(target=TownWorker, args=(workerConnection, parameters, townSeed), daemon=True)
+            process.start()
+            workerConnection.close()
+            self.connections.append(connection)
+            self.processes.append(process)
+
+        self.summaries = [connection.recv() for connection in self.connections]
+        self.currentDay = 0
+
+
+    def ImportProbabilities(self):
+        '''
+        Returns the probability that a Susceptible resident of each town is infected outside the town during the next day.
+
+        Residents of town i that commute to town j meet j's infectious people, and infectious commuters from j visit town i.
+        With p the fraction of infectious people of each town and N its population, the daily force of infection on town i is
+            beta_i * sum_j (mobility[i][j] * p_j + mobility[j][i] * N_j / N_i * p_j)
+        where beta_i = r0 / daysOfInfection of town i (the transmission rate of a well-mixed town, see Model.Interaction).
+        '''
+        summaries = np.array([summary[:6] for summary in self.summaries], dtype=np.float64)
+        population, infectious, r0, daysOfInfection = summaries[:, 0], summaries[:, 2], summaries[:, 4], summaries[:, 5]
+        prevalence = infectious / population
+        visitors = self.mobility.T * population[None, :] # visitors[i][j]: Residents of j that spend the day in town i.
+
+        pressure = self.mobility @ prevalence + (visitors @ prevalence) / population
+        return 1 - np.exp(-r0 / daysOfInfection * pressure)
+
+
+    def Run(self, days):
+        '''
+        Runs every town for the given number of days (in parallel) and returns the results (see Results).
+        '''
+        for day in range(days):
+            for connection, probability in zip(self.connections, self.ImportProbabilities()):
+                connection.send(("day", float(probability)))
+            self.summaries = [connection.recv() for connection in self.connections]
+            self.currentDay += 1
+        return self.Results()
+
+
+    def Results(self):
+        '''
+        Returns a dictionary with the results of each town (list of Model.Results, "towns") and of the whole region
+        ("days", "S", "I", "R": percentages of the region's population).
+        '''
+        for connection in self.connections:
+            connection.send(("results", None))
+        towns = [connection.recv() for connection in self.connections]
+
+        population = np.array([summary[0] for summary in self.summaries], dtype=np.float64)
+        weights = population / population.sum()
+        results = {"towns": towns, "days": towns[0]["days"]}
+        for state in ("S", "I", "R"):
+            results[state] = np.sum([weight * town[state] for weight, town in zip(weights, towns)], axis=0)
+        return results
+
+
+    def EmergencyLevels(self):
+        '''
+        Returns the current Emergency Level of each town.
+        '''
+        return [summary[6] for summary in self.summaries]
+
+
+    def Close(self):
+        for connection, process in zip(self.connections, self.processes):
+            if (process.is_alive()):
+                connection.send(("stop", None))
+            process.join()
+            connection.close()
+        self.connections = []
+        self.processes = []
+
+
+    def __enter__(self):
+        return self
+
+
+    def __exit__(self, excType, excValue, traceback):
+        self.Close()
@@ -1,14 +1,20 @@
-import random
+import copy
 import math
 import numpy as np
-import plot
-import matplotlib.pyplot as plt
-import time
-from numpy.random import choice
-from person import Person
-from town import Town, House, School, Workplace, Hospital, Entertainment, Extracurricular, Transportation, Outdoors
+from population import Population, DrawFamilySizes
+from compartments import Compartments, SUSCEPTIBLE, INFECTIOUS, RECOVERED, STATE_CODES
+from engine import VectorizedEngine
+from occupancy import OccupancyCache
+from transmission import Transmission
+from randomness import CreateGenerator, SpawnGenerators, RandomBuffer
+from scheduler import EventScheduler, RECOVERY, DISCHARGE, HOSPITALIZATION
+from recorder import Recorder, OTHER
+from town import LOCATION_CODES, HOSPITAL, Town, House, School, Workplace, Hospital, Entertainment, Extracurricular, Transportation, Outdoors
 from progressbar import printProgressBar
 
+EMERGENCY_THRESHOLDS = [5, 10, 20] # Infectious percentages at which Emergency Levels 1, 2 and 3 start (see NextEmergencyLevel).
+CHOICES = {"engine": ["objects", "vectorized"], "backend": ["auto", "numba", "numpy"], "transmissionMode": ["contacts", "aggregate"], "stepping": ["hourly", "blocks"]}
+
 class Model():
     '''
     Class that manages the simulation. Creates objects for each location and person, then runs the simulation with the given parameters.
@@ -20,9 +26,35 @@ class Model():
     r0: Basic reproduction number. Average number of people that each sick person will infect.
     modelType: SIR or SIS model.
     resultsType: View results in Graph or Pie Chart.
+    engine: "objects" runs the hourly loop on "Person" objects, "vectorized" runs it on NumPy arrays (see engine.VectorizedEngine).
+    stepping: "hourly" simulates each hour of the day separately. "blocks" simulates each location once for each block of consecutive hours
+              in which its visitors do not change (e.g. houses at night, workplaces during work hours), with the contacts of all the block's
+              hours (see occupancy.OccupancyCache.Blocks). People infected during a block start infecting others in the location's next block.
+              The hours in which nobody in the town moves (the night) are skipped (see SimulatedHours), so a day takes 17 passes instead of 24.
+              The cost of the other hours is mostly the occupancy updates, so it is about 30% faster than "hourly" (30k people, 60 days:
+              3.6 s vs 5.1 s). The delayed infections and the distinct contacts of a block shift the dynamics a little: at r0 2.5 the peak
+              is the same and the final size is 0.1 to 1.7 points lower (10k and 30k people).
+    backend: Implementation of the vectorized engine's hourly contacts: "numba" (JIT-compiled, see kernels.ContactKernel), "numpy",
+             or "auto" (Numba if it is installed).
+    seed: Seed of the model's random number Generator (integer or numpy.random.SeedSequence, see randomness.CreateGenerator).
+          The same seed gives the same results. None gives a random seed.
+    headless: If True, the model is only built. The simulation is run with Run(days) and the results are returned by Results(),
+              without a progress bar or plots (matplotlib is only imported by ShowResults).
+    emergencyThresholds: Infectious percentages at which Emergency Levels 1, 2 and 3 start.
+    transmissionMode: "contacts" samples the people each infectious person interacts with (see PeopleInteractions), "aggregate" draws the
+                      infections of each location from its hazard for the hour, which costs O(visitors) instead of O(infectious * visitors)
+                      (see AggregateInteractions). Both give the same expected number of infections.
+    hybridThreshold: If given, the days that start with at least this many infectious people are not simulated hour by hour: the day's
+                     infections are drawn at once from the hazards of each age group and family (see hybrid.StratifiedDay), so the days
+                     of a big wave cost about as much as quiet ones. The hourly simulation resumes when the number drops below the threshold.
+    sinks: List of sinks that receive the results of each day as soon as it is simulated (see sinks.Sink), e.g. to follow a long run
+           from a file. They are flushed at the end of each Run and closed by the caller.
+    infectionLog: If given, every infection (day, hour, infector, infectee, location) is recorded in it (see infectionlog.InfectionLog).
+                  It is flushed at the end of each Run and closed by the caller.
+    build: If False, the population is not created (see CreateObjects). Used when the model is restored from a checkpoint (see checkpoint.LoadCheckpoint).
     '''
 
-    def __init__(self, numberOfPpl=500, startingInfectiousPercentage=10, daysOfInfection=5, daysOfSimulation=7, r0=1.0, modelType="SIR", resultsType="graph"):
+    def __init__(self, numberOfPpl=500, startingInfectiousPercentage=10, daysOfInfection=5, daysOfSimulation=7, r0=1.0, modelType="SIR", resultsType="graph", engine="objects", headless=False, seed=None, emergencyThresholds=EMERGENCY_THRESHOLDS, transmissionMode="contacts", stepping="hourly", backend="auto", hybridThreshold=None, sinks=None, infectionLog=None, build=True):
         self.numberOfPpl = numberOfPpl
         self.startingInfectiousPercentage = startingInfectiousPercentage
         self.daysOfInfection = daysOfInfection
@@ -30,11 +62,33 @@ class Model():
         self.r0 = r0
         self.modelType = modelType
         self.resultsType = resultsType
+        self.engine = engine
+        self.headless = headless
+        self.emergencyThresholds = list(emergencyThresholds)
+        self.transmissionMode = transmissionMode
+        self.stepping = stepping
+        self.backend = backend
+        self.hybridThreshold = hybridThreshold
+        self.sinks = list(sinks) if (sinks is not None) else []
+        self.infectionLog = infectionLog
+        for name, choices in CHOICES.items(): # A typo must not quietly switch to another engine or mode.
+            if (getattr(self, name) not in choices):
+                raise ValueError("Unknown " + name + " \"" + str(getattr(self, name)) + "\" (choose from " + ", ".join(choices) + ").")
+
+        self.rng = CreateGenerator(seed) # Source of every random number of the model.
+        self.random = RandomBuffer(self.rng) # Uniform numbers drawn in blocks, for the loops that use one at a time.
+        if (infectionLog is not None and infectionLog.rng is None): # The log's choices are reproducible from the model's seed.
+            infectionLog.rng = SpawnGenerators(self.rng, 1)[0]
         
         self.currentDay = 0 # Day counter
         self.currentHour = 0 # Hour counter
+        self.importedPeople = np.zeros(0, dtype=np.int64) # Infections from other towns of the next day (see ImportInfections).
         
-        self.CreateObjects(self.numberOfPpl, self.startingInfectiousPercentage, self.daysOfInfection, self.daysOfSimulation, self.r0)
+        self.CreateObjects(self.numberOfPpl, self.startingInfectiousPercentage, self.daysOfInfection, self.daysOfSimulation, self.r0, build)
+
+        if (not self.headless):
+            self.Run(self.daysOfSimulation)
+            self.ShowResults()
         
  
 
@@ -49,34 +103,21 @@ class Model():
     def CreatePopulation(self, numberOfPeople):
         '''
         Creates the town's population with the given size (numberOfPpl).
+        The family sizes, the people's characteristics and their routines are drawn for everyone at once.
         '''
-        while (self.peopleCreated < numberOfPeople):            
-            if (numberOfPeople-self.peopleCreated >= 5):
-                numberOfFamilyMembers = choice([1, 2, 3, 4, 5], 1, p=[0.325, 0.312, 0.163, 0.136, 0.064])[0] # Random choice for family members. Percentages based on studies.
-            else:
-                numberOfFamilyMembers = numberOfPeople - self.peopleCreated
-                
-            self.CreateFamily(numberOfFamilyMembers)
-            self.familiesCreated += 1
-
-
-    def CreateFamily(self, numberOfFamilyMembers):
-        '''
-        Creates family members.
-        '''
-        for i in range (numberOfFamilyMembers):
-            agegroup = choice(["Underage", "Young Adult", "Adult", "Middle Aged", "Elderly"], 1, p=[0.2035, 0.054, 0.192, 0.349, 0.2015])[0] # Random choice for person's age group. Percentages based on studies.
-            self.CreatePerson(agegroup)
+        familySizes = DrawFamilySizes(numberOfPeople, self.rng)
+        self.familiesCreated = len(familySizes)
+        self.population.Generate(np.repeat(np.arange(self.familiesCreated), familySizes)) # People of the same family share a house.
+        self.population.CreateRoutines()
+        self.peopleCreated = numberOfPeople
 
 
-    def CreatePerson(self, agegroup):
+    @property
+    def people(self):
         '''
-        Creation of Person object. houseID is the current family's number. In other words, how many families have been created so far.
+        List of "Person" objects (views of the population's rows), created on first use.
         '''
-        newPerson = Person(ID=self.peopleCreated, houseID=self.familiesCreated, agegroup=agegroup, town=self.town)
-        self.people.append(newPerson)
-        self.people_S.append(newPerson) # Susceptible by default.
-        self.peopleCreated = self.peopleCreated + 1
+        return self.population.People()
 
 
 
@@ -84,131 +125,155 @@ class Model():
         '''
         Returns the percentage of people with the given state ('S/I/R').
         '''        
-        if (state == "S"):
-            return round(len(self.people_S)/self.peopleCreated*100, 2)
-        elif (state == "I"):
-            return round(len(self.people_I)/self.peopleCreated*100, 2)
-        elif (state == "R"):
-            return round(len(self.people_R)/self.peopleCreated*100, 2)
+        if (state in STATE_CODES):
+            return self.compartments.Percentage(STATE_CODES[state])
             
         return 0
+
+
+    # Lists of "Person" objects in each state, built from the compartments.
+    @property
+    def people_S(self):
+        return [self.people[ID] for ID in self.compartments.People(SUSCEPTIBLE)]
+
+    @property
+    def people_I(self):
+        return [self.people[ID] for ID in self.compartments.People(INFECTIOUS)]
+
+    @property
+    def people_R(self):
+        return [self.people[ID] for ID in self.compartments.People(RECOVERED)]
         
 
 
-    def InitRecoveryLog(self):
+    def ExecEvents(self, day, hospitalOccupancy):
         '''
-        Initialization of recoveryLog (dictionary of people who recover at the end of each day).
-        Key: day number
-        Value: list with "Person" objects that need to be recovered
+        Applies the events of the given day (see scheduler.EventScheduler), each kind in one batch:
+        recoveries (Infected to Recovered, or Susceptible depending on the model type), discharges (hospitalized people return to
+        their daily routine) and hospitalizations (see Person.Hospitalize). Used by both engines (see engine.VectorizedEngine).
+        hospitalOccupancy: Hospital visitors during the last hour of the day.
         '''
-        for i in range(1, self.daysOfSimulation + self.daysOfInfection+2):
-            self.recoveryLog[i] = [] # Empty list for each day of simulation.
-       
+        recovered, discharged, hospitalized = self.events.PopDay(day)
+
+        if (len(recovered) > 0):
+            self.compartments.SetMany(recovered, SUSCEPTIBLE if (self.modelType == "SIS") else RECOVERED)
+        if (len(discharged) > 0):
+            self.population.Discharge(discharged)
+        if (len(hospitalized) > 0):
+            hospitalIsFull = hospitalOccupancy >= Hospital.capacity
+            self.population.Hospitalize(hospitalized, hospitalIsFull) # If the hospital is full, the people stay in their home instead.
+            if (hospitalIsFull):
+                self.recorder.hospitalOverflow[day] += len(hospitalized)
 
-    def ExecRecoveryLog(self):
-        '''
-        Checks if there are any people who need to recover today and executes the command.
-        '''
-        for person in self.recoveryLog[self.currentDay]:
-            self.Recover(person)
 
-   
-   
-    def InitHospitalizationLog(self):
-        '''
-        Initialization of hospitalizationLog (dictionary of people who need to be hospitalized at the end of each day).
-        Key: day number
-        Value: list with "Person" objects that need to be hospitalized
-        '''
-        for i in range(0, self.daysOfSimulation + self.daysOfInfection+2):
-            self.hospitalizationLog[i] = [] # Empty list for each day of simulation.
-       
 
-    def ExecHospitalizationLog(self):
+    def Infect(self, person, location=OTHER, source=None):
         '''
-        Checks if there are any people who need to be hospitalized today and executes the command.
+        Converts the state of the given person from Susceptible to Infected and checks if they will need hospitalization (see InfectPeople).
+        location: Code of the kind of location where the person was infected (see recorder.Recorder).
+        source: (hour, infector ID, location ID) of the infection for the infection log (see infectionlog.InfectionLog), None if unknown.
         '''
-        for person in self.hospitalizationLog[self.currentDay]:
-            person.Hospitalize()
+        self.InfectPeople(np.array([person.ID]), self.currentDay, location, source)
 
 
-
-    def Infect(self, person):
+    def InfectPeople(self, people, day, locations=OTHER, source=None):
         '''
-        Converts the state of the given person from Susceptible to Infected and checks if they will need hospitalization.
+        Converts the state of the given people (array of IDs) from Susceptible to Infected on the given day and checks if they will
+        need hospitalization. Used by both engines (see engine.VectorizedEngine.Infect).
+        locations: Location code of each infection, or one code for all of them (see recorder.Recorder).
+        source: (hour, infector IDs, location IDs) of the infections for the infection log (see infectionlog.InfectionLog), None if unknown.
         '''
-        self.recoveryLog[self.currentDay+self.daysOfInfection+1].append(person)
-        
-        self.people_S.remove(person)
-        self.people_I.append(person)
-        
+        self.compartments.SetMany(people, INFECTIOUS)
+        self.recorder.AddInfections(day, self.population.agegroup[people], locations)
+        if (self.infectionLog is not None):
+            hour, infectors, locationIDs = source if (source is not None) else (-1, -1, -1)
+            self.infectionLog.Append(day, hour, infectors, people, locations, locationIDs)
+        dayOfRecovery = day + self.daysOfInfection + 1
+        self.events.Schedule(dayOfRecovery, RECOVERY, people)
+
         '''
         Hospitalization:
         First, we set an arbitrary value for the base percentage of people that will need medical care.
         Then, the percentage increases depending on the person's age (healthFactor).        
         For example, 66+ y.o. people are 9.67 times more likely to need medical care than the base case (25- y.o. people).
-        If the person is decided to need medical care he is hospitalized exactly D days after his infection, where D = ceil(infectious_period * 1/3).
-        '''                
-        hospitalizationPercentage = 1
-        hospitalizationPercentage = hospitalizationPercentage * person.healthFactor
-        
-        if (random.random()*100 <= hospitalizationPercentage):
-            dayOfHospitalization = math.ceil(self.daysOfInfection*1/3)
-            self.hospitalizationLog[dayOfHospitalization].append(person)
+        If the person is decided to need medical care he is hospitalized exactly D days after his infection, where D = ceil(infectious_period * 1/3),
+        and discharged when he recovers.
+        '''
+        hospitalizationPercentage = 1 * self.population.healthFactor[people]
+        hospitalized = people[self.rng.random(len(people))*100 <= hospitalizationPercentage]
+        if (len(hospitalized) > 0):
+            self.events.Schedule(day + math.ceil(self.daysOfInfection*1/3), HOSPITALIZATION, hospitalized)
+            self.events.Schedule(dayOfRecovery, DISCHARGE, hospitalized)
 
 
-    def Recover(self, person):
+
+    def ImportInfections(self, probability):
         '''
-        Converts the state of the given person from Infected to Recovered (or Susceptible, depending on the model type).
-        '''    
-        self.people_I.remove(person)
+        Infects each Susceptible person with the given probability (infections from outside the town, see metapopulation.Metapopulation).
+        The people are chosen now and infected at the start of the next simulated day, so the infections are counted on that day and
+        their recoveries and hospitalizations are scheduled like the infections inside the town. Returns the number of infected people.
+        '''
+        susceptible = self.compartments.People(SUSCEPTIBLE)
+        if (len(self.importedPeople) > 0):
+            susceptible = susceptible[~np.isin(susceptible, self.importedPeople)]
+        count = self.rng.binomial(len(susceptible), probability)
+        if (count == 0):
+            return 0
+        self.importedPeople = np.concatenate((self.importedPeople, self.rng.choice(susceptible, count, replace=False)))
+        return count
 
-        if (self.modelType == "SIS"):
-            self.people_S.append(person)
-        elif (self.modelType == "SIR"):
-            self.people_R.append(person)        
-        
-        if (person.isHospitalized): # If the person was hospitalized, they are discharged and return to their daily routine.
-            person.ModifyRoutine(self.emergencyLevel)        
-            person.isHospitalized = False
+
+    def TakeImportedInfections(self):
+        '''
+        Returns the people infected from outside the town for the current day (see ImportInfections) and clears the list.
+        '''
+        people = self.importedPeople
+        self.importedPeople = np.zeros(0, dtype=np.int64)
+        return people
 
 
 
+    def SimulatedHours(self, occupancy, level):
+        '''
+        Returns the hours of the day that are simulated: all of them with the "hourly" stepping mode. With the "blocks" stepping mode,
+        the hours in which no location starts a block (nobody in the town moves, e.g. at night) are part of the blocks that started
+        earlier, so they are skipped. The last hour is always simulated, it gives the hospital occupancy for the day's hospitalizations.
+        occupancy: The engine's occupancy cache (see occupancy.OccupancyCache.Blocks).
+        '''
+        if (self.stepping != "blocks"):
+            return range(24)
+        startsBlock = occupancy.Blocks(level).any(axis=1)
+        startsBlock[23] = True
+        return np.flatnonzero(startsBlock).tolist()
+
+
     def FillBuildings(self):
         '''
-        Fills each location's list with "Person" objects that should be there during the current hour.
+        Fills the lists of the active locations (at least one Infectious and one Susceptible visitor) with the "Person" objects
+        that are there during the current hour. Nobody can be infected in the other locations, so they stay empty.
+        The people's locations (routines, full Transportation and Entertainment places) come from the occupancy cache (see occupancy.OccupancyCache).
         '''
-        for person in self.people:
-            location = person.routine[self.currentHour][0]
-            locationID = person.routine[self.currentHour][1]
-            
-            if (location == "School"):
-                self.town.schools[locationID].currentVisitors.append(person)
-            elif (location == "Workplace"):
-                self.town.workplaces[locationID].currentVisitors.append(person)
-            elif (location == "Transportation"):
-                if (not self.town.transportations[locationID].IsFull(self.emergencyLevel)): # Transportation is not full.
-                    self.town.transportations[locationID].currentVisitors.append(person)
-                else: # If transportation is full, move by foot.
-                    self.town.outdoors[0].currentVisitors.append(person)
-            elif (location == "Extracurricular"):
-                self.town.extracurriculars[locationID].currentVisitors.append(person)
-            elif (location == "Entertainment" and not self.town.entertainments[locationID].IsFull(self.emergencyLevel)): # If the place is full, the person stays at home.
-                self.town.entertainments[locationID].currentVisitors.append(person)
-            elif (location == "Outdoors"):
-                self.town.outdoors[locationID].currentVisitors.append(person)
-            elif (location == "Hospital"):
-                self.town.hospitals[locationID].currentVisitors.append(person)
-            else:
-                self.town.houses[person.houseID].currentVisitors.append(person)
+        occupancy = self.LocationOccupancy().Get(self.currentHour, self.emergencyLevel)
+        self.hospitalVisitors = int(occupancy.visitors[self.occupancy.offsets[HOSPITAL]])
+
+        isActive = self.occupancy.IsActive(occupancy)
+        if (self.stepping == "blocks"): # Locations in the middle of a block were simulated at its first hour.
+            isActive &= self.occupancy.Blocks(self.emergencyLevel)[self.currentHour] > 0
+
+        people = self.people
+        for index in np.flatnonzero(isActive).tolist():
+            location = self.town.locations[index]
+            location.currentVisitors.extend([people[ID] for ID in occupancy.order[occupancy.starts[index]:occupancy.ends[index]].tolist()])
+            self.filledLocations.append(location)
 
 
     def EmptyBuildings(self):
         '''
-        Clears each location's current visitors.
+        Clears the current visitors of the locations filled by FillBuildings.
         '''
-        for location in self.town.locations:
+        for location in self.filledLocations:
             location.currentVisitors.clear()
+        self.filledLocations = []
         
 
 
@@ -216,8 +281,18 @@ class Model():
         '''
         Each infectious person interacts with other people in the same location.
         The number of "other people" is based on the location and the Emergency Level.
+        People infected during the hour are appended to the infectious index and interact in the same hour, except with the "blocks"
+        stepping mode: like in the vectorized engine, the people infected during a block interact from the location's next block.
         '''    
-        for infectedPerson in self.people_I:
+        if (self.transmissionMode == "aggregate"):
+            self.AggregateInteractions()
+            return
+
+        numberOfInfectious = self.compartments.numberOfInfectious # Infectious people at the start of the hour.
+        i = 0
+        while (i < (numberOfInfectious if (self.stepping == "blocks") else self.compartments.numberOfInfectious)):
+            infectedPerson = self.people[self.compartments.infectious[i]]
+            i += 1
             location = infectedPerson.routine[self.currentHour][0]
             locationID = infectedPerson.routine[self.currentHour][1]
             
@@ -239,145 +314,396 @@ class Model():
             elif (location == "Hospital"):
                 currentLocation = self.town.hospitals[locationID]
 
-            otherVisitors = [p for p in currentLocation.currentVisitors if p != infectedPerson] # People in the same location (except the person itself).
-            
-            if (len(currentLocation.currentVisitors) > 0): # If the person is not alone in the location...
-                sdf = 1 - 0.2 * self.emergencyLevel # Social Distacing Factor
-                numberOfInteractions = math.ceil(infectedPerson.interactions[self.currentHour] * sdf)
-                numberOfInteractions = math.ceil(numberOfInteractions * infectedPerson.legalityFactor)
+            if (len(currentLocation.currentVisitors) > 0): # If the location is active (see FillBuildings) and the person is not alone in it...
+                otherVisitors = [p for p in currentLocation.currentVisitors if p != infectedPerson] # People in the same location (except the person itself).
+                index = self.occupancy.offsets[LOCATION_CODES[location]] + locationID
+                numberOfInteractions = self.Contacts(infectedPerson.ID, index, len(otherVisitors)) # Based on the Social Distancing Factor and the person's legalityFactor.
+                repeats = 1
                 
-                if (len(currentLocation.currentVisitors) > numberOfInteractions):               
-                    otherPeople = random.sample(otherVisitors, numberOfInteractions)
-                else: # Interact with all of them.
+                if (len(otherVisitors) > numberOfInteractions):               
+                    otherPeople = self.random.Sample(otherVisitors, numberOfInteractions)
+                else: # Interact with all of them (more than once each during a long block).
                     otherPeople = otherVisitors 
+                    repeats = numberOfInteractions / max(len(otherVisitors), 1)
 
+                maskRequired = self.transmission.maskRequired[LOCATION_CODES[location]]
                 for otherPerson in otherPeople:
-                    self.Interaction(infectedPerson, otherPerson, location)
+                    self.Interaction(infectedPerson, otherPerson, maskRequired, repeats, LOCATION_CODES[location], locationID)
                     
 
                     
-    def Interaction(self, person1, person2, location):
+    def AggregateInteractions(self):
+        '''
+        Transmission mode "aggregate": the infections of the hour are drawn from the hazard of each location with infectious people
+        (same formula as engine.VectorizedEngine.AggregateTransmission), so each visitor of those locations is visited once.
+        People infected during the hour start infecting others in the next hour.
+        '''
+        transmission = self.transmission
+        pressure = {} # Key: location index in town.locations, Value: sum of the infectious visitors' chances to infect each other visitor.
+        spreaders = {} # Key: location index, Value: IDs and chances of the infectious visitors (only for the infection log).
+        offsets = self.occupancy.offsets
+        infectious = self.compartments.Infectious()
+        placed = self.occupancy.Get(self.currentHour, self.emergencyLevel).Location(infectious) # The person may not have fit in their routine's location (see FillBuildings).
+
+        for ID, placedIndex in zip(infectious.tolist(), placed.tolist()):
+            location, locationID = self.people[ID].routine[self.currentHour][:2]
+            code = LOCATION_CODES[location]
+            index = offsets[code] + locationID
+            others = len(self.town.locations[index].currentVisitors) - (placedIndex == index)
+            if (others <= 0):
+                continue
+
+            numberOfInteractions = self.Contacts(ID, index, others)
+            infectivity = transmission.transmissionBase[ID] * numberOfInteractions / others
+            if (transmission.maskRequired[code]):
+                infectivity *= transmission.MaskFactor(ID)
+            pressure[index] = pressure.get(index, 0) + infectivity
+            if (self.infectionLog is not None):
+                spreaders.setdefault(index, []).append((ID, infectivity))
+
+        for index, locationPressure in pressure.items():
+            code = int(np.searchsorted(offsets, index, side="right") - 1)
+            maskRequired = transmission.maskRequired[code]
+            for person in self.town.locations[index].currentVisitors:
+                if (self.compartments.state[person.ID] != SUSCEPTIBLE):
+                    continue
+                hazard = locationPressure * transmission.hygieneFactor[person.ID]
+                if (maskRequired):
+                    hazard *= transmission.MaskFactor(person.ID)
+                if (self.random.Random() < -math.expm1(-hazard)):
+                    source = None
+                    if (self.infectionLog is not None): # Infector drawn in proportion to each visitor's part of the hazard.
+                        IDs, weights = np.array(spreaders[index]).T
+                        infector = IDs[self.infectionLog.ChooseInfectors(np.zeros(len(IDs)), weights, np.zeros(1))[0]]
+                        source = (self.currentHour, int(infector), index - offsets[code])
+                    self.Infect(person, code, source)
+
+
+
+    def Contacts(self, ID, index, others):
+        '''
+        Returns the number of interactions of the given person at the location with the given index (in town.locations) during the current step:
+        the current hour, or the block of hours that starts with it for the location ("blocks" stepping mode). At most "others" per hour.
+        '''
+        hours = 1 if (self.stepping != "blocks") else int(self.occupancy.Blocks(self.emergencyLevel)[self.currentHour, index])
+        return sum(min(int(self.transmission.numberOfInteractions[ID, hour]), others) for hour in range(self.currentHour, self.currentHour + hours))
+
+
+
+    def Interaction(self, person1, person2, maskRequired, repeats=1, location=OTHER, locationID=-1):
         '''
         person1 (I) "interacts" with person2 (S) and has a possibility to infect them.
+        maskRequired: Whether masks are mandatory at person1's location.
+        repeats: Number of interactions that the contact stands for (see the "blocks" stepping mode).
+        location, locationID: Code and ID of the location of the interaction (recorded with the infection).
+        The chances are read from the precomputed coefficients (see transmission.Transmission).
         '''
         
-        if (person2 not in self.people_S): # Continue only if the second person is Susceptible.
+        if (self.compartments.state[person2.ID] != SUSCEPTIBLE): # Continue only if the second person is Susceptible.
             return
             
-        total_interactions = sum(person1.interactions) * self.daysOfInfection # Total number of person1's interactions during the infectious period (Daily interactions * Infectious period).
-        
-        transmission_chance = self.r0/total_interactions # Chance for transmission for each person that interacts with "person1" (r0 / person1's total interactions).
+        transmission = self.transmission
         
-        transmission_chance = transmission_chance * person1.hygieneFactor * person2.hygieneFactor # The chance is affected by both people's hygiene factor.
+        # Chance for transmission (r0 / person1's total interactions), affected by both people's hygiene factor.
+        transmission_chance = transmission.transmissionBase[person1.ID] * transmission.hygieneFactor[person2.ID]
 
         # For each person wearing a mask, the transmission chance is reduced by 80%.
-        if (person1.IsWearingMask(location, self.emergencyLevel)):
-            transmission_chance = transmission_chance * 0.2
-            
-        if (person2.IsWearingMask(location, self.emergencyLevel)):
-            transmission_chance = transmission_chance * 0.2
+        if (maskRequired):
+            if (self.random.Random() <= transmission.obedience[person1.ID]):
+                transmission_chance = transmission_chance * 0.2
+                
+            if (self.random.Random() <= transmission.obedience[person2.ID]):
+                transmission_chance = transmission_chance * 0.2
 
         
-        if (random.random() <= transmission_chance):
-            self.Infect(person2)
+        if (repeats > 1): # Chance of at least one transmission.
+            transmission_chance = 1 - (1 - transmission_chance) ** repeats
+
+        if (self.random.Random() <= transmission_chance):
+            self.Infect(person2, location, (self.currentHour, person1.ID, locationID))
             
 
 
-    def SetEmergencyLevel(self):
+    def UpdateEmergencyLevel(self, emergencyLevel):
         '''
-        Sets the current day's Emergency Level depending on the infectious percentage.
+        Returns the current day's Emergency Level depending on the infectious percentage, given the previous day's level.
+        If the Emergency Level changes, switches to each person's routine and the interaction coefficients for the new level.
+        Used by both engines (see engine.VectorizedEngine).
         '''    
         percentage_I = self.Percentage("I") # Percentage of infectious people at the start of the day.
         
-        if (percentage_I < 5):
-            if (self.emergencyLevel > 0): # Cannot drop back to Level 0.
-                newEmergencyLevel = 1
-            else:
-                newEmergencyLevel = 0
-        elif (percentage_I < 10):
-            newEmergencyLevel = 1
-        elif (percentage_I < 20):
-            newEmergencyLevel = 2
-        elif (percentage_I >= 20):
-            newEmergencyLevel = 3
+        newEmergencyLevel = self.NextEmergencyLevel(percentage_I, emergencyLevel, self.emergencyThresholds)
             
-        if (newEmergencyLevel != self.emergencyLevel): # If the Emergency Level changed, modify each person's schedule.
-            for person in self.people:
-                person.ModifyRoutine(newEmergencyLevel)
-                
-        self.emergencyLevel = newEmergencyLevel
+        if (newEmergencyLevel != emergencyLevel):
+            self.population.SetEmergencyLevel(newEmergencyLevel)
+            self.transmission.SetEmergencyLevel(newEmergencyLevel)
+        return newEmergencyLevel
+
+
+    @staticmethod
+    def NextEmergencyLevel(percentage_I, emergencyLevel, thresholds=EMERGENCY_THRESHOLDS):
+        '''
+        Returns the Emergency Level for the given infectious percentage and the current Emergency Level.
+        thresholds: Infectious percentages at which Emergency Levels 1, 2 and 3 start.
+        '''
+        if (percentage_I < thresholds[0]):
+            if (emergencyLevel > 0): # Cannot drop back to Level 0.
+                return 1
+            return 0
+        elif (percentage_I < thresholds[1]):
+            return 1
+        elif (percentage_I < thresholds[2]):
+            return 2
+        return 3
+
+
+        
+    def Run(self, days, checkpointInterval=None, checkpointPath=None):
+        '''
+        Runs the simulation for the given number of days (continuing from the current day) and returns the results (see Results).
+
+        checkpointInterval: If given, the state of the simulation is saved to checkpointPath every "checkpointInterval" days
+                            and at the end of the run (see checkpoint.SaveCheckpoint).
+        '''
+        lastDay = self.currentDay + days
+        if (lastDay > self.daysOfSimulation): # Extend the results' time axis.
+            self.daysOfSimulation = lastDay
+        self.recorder.Reserve(lastDay)
+
+        if (not self.headless):
+            printProgressBar(self.currentDay, self.daysOfSimulation, prefix = 'Running Simulation...', length = 50) # Initialization of progress bar.
+
+        if (checkpointInterval is None):
+            self.RunSimulation(lastDay)
+            return self.Results()
+
+        from checkpoint import SaveCheckpoint # Imported when needed (checkpoint imports this module).
+        while (True):
+            self.RunSimulation(min(lastDay, (self.currentDay // checkpointInterval + 1) * checkpointInterval))
+            SaveCheckpoint(self, checkpointPath)
+            if (self.currentDay >= lastDay):
+                break
+        return self.Results()
+
+
+    def Fork(self, seed=None, **changes):
+        '''
+        Returns an independent copy of the model at its current day, e.g. to continue a run under different "what if" scenarios
+        without simulating the common days again.
+
+        The copy shares the arrays that do not change during a simulation (the population's characteristics and routines, the
+        cached occupancy of the vectorized engine and the town) and copies only the state that changes (compartments,
+        hospitalizations, scheduled events and results), so forking costs a few copies of per-person arrays.
+
+        seed: Seed of the copy's Generator. By default, the copy gets a child stream of this model's Generator (see randomness.SpawnGenerators).
+        changes: Parameters that are different in the copy: r0, daysOfInfection, modelType, emergencyThresholds, resultsType, transmissionMode, stepping,
+                 hybridThreshold, sinks, infectionLog (the copy has no sinks and no infection log by default).
+        '''
+        unsupported = set(changes) - {"r0", "daysOfInfection", "modelType", "emergencyThresholds", "resultsType", "transmissionMode", "stepping", "hybridThreshold", "sinks", "infectionLog"}
+        if (len(unsupported) > 0):
+            raise ValueError("Cannot change " + ", ".join(sorted(unsupported)) + " in a fork.")
+
+        parameters = {"numberOfPpl": self.numberOfPpl, "startingInfectiousPercentage": self.startingInfectiousPercentage, "daysOfInfection": self.daysOfInfection,
+                      "daysOfSimulation": self.daysOfSimulation, "r0": self.r0, "modelType": self.modelType, "resultsType": self.resultsType,
+                      "engine": self.engine, "emergencyThresholds": self.emergencyThresholds, "transmissionMode": self.transmissionMode, "stepping": self.stepping, "backend": self.backend,
+                      "hybridThreshold": self.hybridThreshold}
+        parameters.update(changes)
+        rng = CreateGenerator(seed) if (seed is not None) else SpawnGenerators(self.rng, 1)[0]
+        model = Model(**parameters, headless=True, seed=rng, build=False)
+        model.headless = self.headless
+
+        model.town = self.town # The visitor lists of the locations are filled again every hour.
+        model.population = self.population.Fork(model.rng)
+        model.familiesCreated = self.familiesCreated
+        model.peopleCreated = self.peopleCreated
+        if (model.r0 != self.r0 or model.daysOfInfection != self.daysOfInfection):
+            model.transmission = Transmission(model.population, model.r0, model.daysOfInfection)
+            model.transmission.SetEmergencyLevel(self.emergencyLevel)
+        else:
+            model.transmission = copy.copy(self.transmission) # The Emergency Level coefficients are replaced, not modified, on a level change.
+            model.stratifiedDay = self.stratifiedDay # Computed from coefficients that do not change.
+
+        model.compartments = self.compartments.Copy()
+        model.currentDay = self.currentDay
+        model.emergencyLevel = self.emergencyLevel
+        model.recorder = self.recorder.Copy()
+        model.events = self.events.Copy()
+        model.importedPeople = self.importedPeople.copy()
+        model.hospitalVisitors = self.hospitalVisitors
+
+        if (self.vectorizedEngine is not None):
+            model.vectorizedEngine = self.vectorizedEngine.Fork(model)
+        return model
+
+
+    def Results(self):
+        '''
+        Returns the results of the days simulated so far as NumPy arrays (one entry per day, starting with day 0).
+        Keys: "days", "S", "I", "R" (percentages) and "emergencyLevels". The counts and the other daily columns are kept by the recorder (see recorder.Recorder).
+        '''
+        percentages = self.recorder.Percentages()
+        return {"days": np.arange(len(percentages)), "S": percentages[:, 0], "I": percentages[:, 1], "R": percentages[:, 2], "emergencyLevels": self.recorder.emergencyLevels[:len(percentages)].copy()}
 
 
         
     def RunSimulation(self, days):
-        # At the beginning, infect x random people (Where x = startingInfectiousPopulation)...
-        randomPeople = random.sample(self.people_S, self.startingInfectiousPopulation)
-        for person in randomPeople:   
-            self.Infect(person)
-            
-        self.percentagesPerDay.append([self.Percentage("S"), self.Percentage("I"), self.Percentage("R")]) # Day 0 percentages
-        self.emergencyLevelsPerDay.append(0)
+        '''
+        Runs the simulation until the given day. The starting infectious people are infected on the first call.
+        Each finished day is passed to the sinks (see WriteDay).
+        '''
+        if (self.engine == "vectorized"):
+            if (self.vectorizedEngine is None):
+                self.vectorizedEngine = VectorizedEngine(self)
+            self.vectorizedEngine.RunSimulation(days)
+            self.FlushOutput()
+            return
+
+        if (self.recorder.numberOfDays == 0):
+            # At the beginning, infect x random people (Where x = startingInfectiousPopulation)...
+            randomPeople = self.rng.choice(self.compartments.People(SUSCEPTIBLE), self.startingInfectiousPopulation, replace=False)
+            for ID in randomPeople:   
+                self.Infect(self.people[ID])
+                
+            self.RecordDay(0, 0, self.LocationOccupancy()) # Day 0 counts
+            self.WriteDay(0)
         
         while (self.currentDay < days): # Days loop
             self.currentDay += 1
             self.currentHour = 0
-            printProgressBar(self.currentDay, self.daysOfSimulation, prefix = 'Running Simulation...', length = 50) # Update the progress bar.
+            if (not self.headless):
+                printProgressBar(self.currentDay, self.daysOfSimulation, prefix = 'Running Simulation...', length = 50) # Update the progress bar.
             
-            self.SetEmergencyLevel() # Update Emergency Level depending on the infectious percentage.
-            self.emergencyLevelsPerDay.append(self.emergencyLevel) # Update emergencyLevels
-            self.percentagesPerDay.append([self.Percentage("S"), self.Percentage("I"), self.Percentage("R")]) # Update percentagesPerDay
+            self.emergencyLevel = self.UpdateEmergencyLevel(self.emergencyLevel) # Update Emergency Level depending on the infectious percentage.
+            self.RecordDay(self.currentDay, self.emergencyLevel, self.LocationOccupancy()) # Counts at the start of the day.
+            for ID in self.TakeImportedInfections().tolist():
+                self.Infect(self.people[ID])
+
+            newlyInfected = self.StratifiedInfections(self.emergencyLevel)
+            if (newlyInfected is not None): # Hybrid mode, many infectious people: the day's infections are drawn at once.
+                for ID, location, infector, locationID in zip(*(array.tolist() for array in newlyInfected)):
+                    self.Infect(self.people[ID], location, (-1, infector, locationID))
+                self.hospitalVisitors = self.stratifiedDay.HospitalVisitors(self.population)
+                self.currentHour = 24
+            else:
+                for hour in self.SimulatedHours(self.LocationOccupancy(), self.emergencyLevel): # Hours loop
+                    self.currentHour = hour
+                    self.FillBuildings()
+                    self.PeopleInteractions()
+                    self.EmptyBuildings() # The town's locations are left empty between the hours (they are shared with forks of the model).
+                self.currentHour = 24
+
+            self.ExecEvents(self.currentDay, self.hospitalVisitors) # Recoveries, discharges and hospitalizations of the day.
+            self.WriteDay(self.currentDay)
 
-            for i in range(24): # Hours loop
-                self.EmptyBuildings()
-                self.FillBuildings()
-                self.PeopleInteractions()
-                self.currentHour += 1
+        self.FlushOutput()
 
-            self.ExecRecoveryLog() # Check if there are people that should recover.
-            self.ExecHospitalizationLog() # Check if there are people that should be hospitalized.
 
 
+    def RecordDay(self, day, emergencyLevel, occupancy):
+        '''
+        Records the state at the start of the given day (see recorder.Recorder). The routines do not change during the day
+        (hospitalizations and discharges happen at its end), so the day's capacity overflow is known at its start.
+        occupancy: The occupancy cache of the engine (see occupancy.OccupancyCache.Unplaced).
+        '''
+        population = self.population
+        hospitalOccupancy = np.count_nonzero(population.hospitalLocation[population.isHospitalized] == HOSPITAL)
+        self.recorder.StartDay(day, self.compartments.counts, emergencyLevel, hospitalOccupancy)
+        self.recorder.capacityOverflow[day] = occupancy.Unplaced(emergencyLevel)
+
 
-    def CreateObjects(self, numberOfPpl, startingInfectiousPercentage, daysOfInfection, daysOfSimulation, r0):
+    def WriteDay(self, day):
         '''
-        Creates objects for each location and person.
+        Passes the recorded row of the given (finished) day to the sinks.
+        '''
+        if (len(self.sinks) > 0):
+            row = self.recorder.Row(day)
+            for sink in self.sinks:
+                sink.Day(row)
+
+
+    def FlushOutput(self):
+        '''
+        Flushes the sinks and the infection log (at the end of each Run).
+        '''
+        for sink in self.sinks:
+            sink.Flush()
+        if (self.infectionLog is not None):
+            self.infectionLog.Flush()
+
+
+    def LocationOccupancy(self):
+        '''
+        Returns the occupancy cache of the "objects" engine (see FillBuildings), created on first use.
+        '''
+        if (self.occupancy is None):
+            locationCounts = self.town.LocationCounts()
+            offsets = np.concatenate(([0], np.cumsum(locationCounts)[:-1]))
+            self.occupancy = OccupancyCache(self.population, offsets, sum(locationCounts), self.compartments)
+        return self.occupancy
+
+
+    def StratifiedInfections(self, emergencyLevel):
+        '''
+        Hybrid mode (see hybridThreshold): returns the IDs of the people infected during the current day and the location code,
+        infector and location ID of each infection if it starts with at least hybridThreshold infectious people (see hybrid.StratifiedDay),
+        otherwise None (the day is simulated hour by hour).
+        emergencyLevel: The day's Emergency Level (the vectorized engine writes it to the model at the end of the run).
+        '''
+        if (self.hybridThreshold is None or self.compartments.Count(INFECTIOUS) < self.hybridThreshold):
+            return None
+        if (self.stratifiedDay is None):
+            from hybrid import StratifiedDay # Imported when needed (hybrid imports meanfield, which imports this module).
+            self.stratifiedDay = StratifiedDay(self.population, self.transmission, self.daysOfInfection)
+        return self.stratifiedDay.Infections(self.compartments, self.population, emergencyLevel, self.rng, self.infectionLog)
+
+
+
+    def CreateObjects(self, numberOfPpl, startingInfectiousPercentage, daysOfInfection, daysOfSimulation, r0, build=True):
+        '''
+        Creates objects for each location and person (the simulation is run by Run).
+        If "build" is False, the population's columns are left empty and the houses are not created, so they can be restored
+        from a checkpoint (followed by CreateLocations).
         '''
         self.startingInfectiousPopulation = round(numberOfPpl*startingInfectiousPercentage/100) # Converting percentage to number.
         
         self.peopleCreated = 0
         self.familiesCreated = 0
 
-        # Initializing lists that will contain "Person" objects.
-        self.people = [] # All people
-        self.people_S = [] # Susceptible people
-        self.people_I = [] # Infectious people
-        self.people_R = [] # Recovered people
+        self.compartments = Compartments(numberOfPpl) # State of each person (people_S/people_I/people_R are built from it).
      
-        # Lists that store the simulation results per day.
-        self.percentagesPerDay = []
-        self.emergencyLevelsPerDay = []
+        self.recorder = Recorder(numberOfPpl, daysOfSimulation) # Results per day.
 
-        self.recoveryLog = {} # Dictionary that stores the people that need to recover at the end of each day. Key: number of day, Value: list of "Person" objects.
-        self.InitRecoveryLog()
-
-        self.hospitalizationLog = {} # Dictionary that stores the people that need to get hospitalized at the end of each day. Key: number of day, Value: list of "Person" objects.
-        self.InitHospitalizationLog()
+        self.events = EventScheduler() # Recoveries, discharges and hospitalizations scheduled for the next days.
 
         self.town = Town(numberOfPpl) # Creation of Town object
 
-        self.CreatePopulation(numberOfPpl) # Creation of Person objects
+        self.population = Population(numberOfPpl, self.town, self.rng) # Storage of the residents' characteristics
 
-        self.CreateHouses() # Creation of House objects (one for each family)
+        if (build):
+            self.CreatePopulation(numberOfPpl) # Creation of Person objects
 
-        self.town.locations = self.town.houses + self.town.schools + self.town.workplaces + self.town.hospitals + self.town.entertainments + self.town.transportations + self.town.extracurriculars + self.town.outdoors # Gathering all created locations in a single list.
+            self.CreateLocations()
 
         self.emergencyLevel = 0
+
+        self.vectorizedEngine = None # Created by the first RunSimulation (engine="vectorized").
+
+        self.occupancy = None # Visitors of each location per hour (engine="objects"), created by the first FillBuildings.
+        self.filledLocations = []
+        self.hospitalVisitors = 0 # Hospital visitors during the last hour of the day.
+        self.stratifiedDay = None # Daily hazards of the hybrid mode, created on first use (see StratifiedInfections).
         
-        printProgressBar(0, self.daysOfSimulation, prefix = 'Running Simulation...', length = 50) # Initialization of progress bar.
+        
+        
+    def CreateLocations(self):
+        '''
+        Creates the houses of the population's families, gathers all locations and computes the coefficients of the interactions.
+        '''
+        self.CreateHouses() # Creation of House objects (one for each family)
 
-        self.RunSimulation(daysOfSimulation)
+        self.transmission = Transmission(self.population, self.r0, self.daysOfInfection) # Per-person coefficients of the interactions
 
-        self.ShowResults()
+        self.town.locations = self.town.houses + self.town.schools + self.town.workplaces + self.town.hospitals + self.town.entertainments + self.town.transportations + self.town.extracurriculars + self.town.outdoors # Gathering all created locations in a single list.
         
         
         
@@ -385,13 +711,18 @@ class Model():
         '''
         Displays the simulation results.
         '''
+        import plot # Imported when needed, so that headless models do not load matplotlib.
+
+        results = self.Results()
+        days = results["days"].tolist()
+        emergencyLevels = results["emergencyLevels"].tolist()
         if (self.resultsType == "graph"):
             if (self.modelType == "SIR"):
-                plot.showPlot(list(range(0,self.daysOfSimulation+1)), [item[1] for item in self.percentagesPerDay], [item[2] for item in self.percentagesPerDay], emergencyLevels=self.emergencyLevelsPerDay, xlabel="Days", ylabel="Percentage", title="Simulation Results")
+                plot.showPlot(days, results["I"].round(2).tolist(), results["R"].round(2).tolist(), emergencyLevels=emergencyLevels, xlabel="Days", ylabel="Percentage", title="Simulation Results")
             elif (self.modelType == "SIS"):
-                plot.showPlot(list(range(0,self.daysOfSimulation+1)), [item[1] for item in self.percentagesPerDay], emergencyLevels=self.emergencyLevelsPerDay, xlabel="Days", ylabel="Percentage", title="Simulation Results")
+                plot.showPlot(days, results["I"].round(2).tolist(), emergencyLevels=emergencyLevels, xlabel="Days", ylabel="Percentage", title="Simulation Results")
         elif (self.resultsType == "pie"):
-            plot.showPieChart(np.array(self.percentagesPerDay), emergencyLevels=self.emergencyLevelsPerDay, title="Simulation Results")
+            plot.showPieChart(np.column_stack((results["S"], results["I"], results["R"])).round(2), emergencyLevels=emergencyLevels, title="Simulation Results")
         
 
 
@@ -0,0 +1,303 @@
+import copy
+import numpy as np
+from compartments import SUSCEPTIBLE, INFECTIOUS
+from routines import LEVEL_ROUTINES
+from town import HOUSE, HOSPITAL, ENTERTAINMENT, TRANSPORTATION, OUTDOORS, Entertainment, Transportation
+
+
+class Occupancy:
+    '''
+    The visitors of every location for one hour of the day (the "currentVisitors" lists after Model.FillBuildings), stored as arrays.
+
+    order: IDs of all people, grouped by location (flat location index, see engine.VectorizedEngine).
+    visitors: Number of people in each location.
+    starts: Index in "order" of each location's first visitor.
+    position: Index of each person in "order".
+    version: Number of routine changes of the population that the occupancy includes (see Population.routineChanges).
+    susceptible: Number of Susceptible visitors of each location.
+    infectious: Number of Infectious people whose routine leads to each location (they interact there, see Model.PeopleInteractions).
+    stateVersion: Number of state changes (see Compartments.changes) that the counts include, -1 before they are counted.
+    '''
+
+    def __init__(self, order, visitors, version):
+        self.order = order
+        self.visitors = visitors
+        self.version = version
+        self.stateVersion = -1
+        self.Index()
+
+
+    def Index(self):
+        self.ends = np.cumsum(self.visitors)
+        self.starts = self.ends - self.visitors
+        self.position = np.empty(len(self.order), dtype=np.int32)
+        self.position[self.order] = np.arange(len(self.order), dtype=np.int32)
+
+
+    def Location(self, people):
+        '''
+        Returns the location where the given people are placed.
+        '''
+        return np.searchsorted(self.ends, self.position[people], side="right")
+
+
+    def Copy(self):
+        '''
+        Returns a copy that shares the visitor arrays (they are replaced, never modified, when patched) but not the state counts.
+        '''
+        occupancy = copy.copy(self)
+        if (self.stateVersion >= 0):
+            occupancy.susceptible = self.susceptible.copy()
+            occupancy.infectious = self.infectious.copy()
+        return occupancy
+
+
+
+class OccupancyCache:
+    '''
+    Keeps the occupancy of each (hour, Emergency Level) once it has been filled.
+
+    The routines repeat every day, so the occupancy of an hour only changes when the routine of some people changes
+    (hospitalization or discharge). Instead of filling every location again, those people are moved from their old
+    location to their new one the next time the occupancy is used (see Patch).
+
+    The number of Susceptible and Infectious visitors of each location is kept up to date from the log of state changes
+    (see UpdateCounts), so the "active" locations, with at least one Infectious and one Susceptible visitor, are known
+    without going through the visitors. Only those need any interaction work.
+    '''
+
+    def __init__(self, population, offsets, numberOfLocations, compartments):
+        self.population = population
+        self.compartments = compartments
+        self.offsets = offsets
+        self.numberOfLocations = numberOfLocations
+        self.isLimited = np.zeros(numberOfLocations, dtype=bool) # Locations with limited capacity (Transportation and Entertainment).
+        for code in (TRANSPORTATION, ENTERTAINMENT):
+            self.isLimited[offsets[code]:offsets[code+1]] = True
+        self.entries = {} # Key: (hour, Emergency Level), Value: Occupancy
+        self.blocks = {} # Key: Emergency Level, Value: see Blocks
+        self.limited = np.flatnonzero(self.isLimited)
+        self.demand = {} # Key: Emergency Level, Value: see Unplaced
+
+
+    def Get(self, hour, level):
+        occupancy = self.entries.get((hour, level))
+        if (occupancy is None):
+            occupancy = self.Fill(hour, level)
+            self.entries[(hour, level)] = occupancy
+            self.UpdateCounts(occupancy, hour, level)
+        else:
+            self.UpdateCounts(occupancy, hour, level) # The changes are counted at the locations before the patch.
+            if (occupancy.version < len(self.population.routineChanges)):
+                self.Patch(occupancy, hour, level)
+        return occupancy
+
+
+    def IsActive(self, occupancy):
+        '''
+        Returns whether each location has at least one Infectious and one Susceptible visitor.
+        '''
+        return (occupancy.susceptible > 0) & (occupancy.infectious > 0)
+
+
+    def UpdateCounts(self, occupancy, hour, level):
+        '''
+        Applies the state changes logged since the occupancy's counts were last updated, or counts the visitors again
+        if the occupancy was filled or patched since (or the log no longer has the changes).
+        '''
+        compartments = self.compartments
+        changes = compartments.ChangesSince(occupancy.stateVersion) if (occupancy.stateVersion >= 0) else None
+        if (changes is None):
+            location = np.repeat(np.arange(self.numberOfLocations), occupancy.visitors) # Location of each entry of "order".
+            occupancy.susceptible = np.bincount(location[compartments.state[occupancy.order] == SUSCEPTIBLE], minlength=self.numberOfLocations)
+            occupancy.infectious = self.CountInfectious(hour)
+        elif (len(changes[0]) > 0):
+            IDs, oldStates, states = changes
+            for counts, location, state in ((occupancy.susceptible, occupancy.Location(IDs), SUSCEPTIBLE), (occupancy.infectious, self.Locations(hour, IDs)[1], INFECTIOUS)):
+                np.subtract.at(counts, location[oldStates == state], 1)
+                np.add.at(counts, location[states == state], 1)
+        occupancy.stateVersion = compartments.Version()
+
+        # The changes seen by every occupancy of the current level are no longer needed (the other levels count again when used).
+        compartments.TrimChanges(min(entry.stateVersion for (entryHour, entryLevel), entry in self.entries.items() if (entryLevel == level)))
+
+
+    def Locations(self, hour, people=slice(None)):
+        '''
+        Returns the location codes and the flat location indices of the given people's active routine for the given hour.
+        '''
+        routineType = self.population.RoutineType(hour, people)
+        return routineType, self.offsets[routineType] + self.population.RoutineID(hour, routineType, people)
+
+
+    def Blocks(self, level):
+        '''
+        Returns a (24, number of locations) array with the length of the block of hours that starts at each hour for each location:
+        the number of consecutive hours during which nobody enters or leaves the location, or 0 if the location's visitors are the
+        same as in the previous hour (the hour belongs to an earlier block). Used by the "blocks" stepping mode (see Model).
+
+        The blocks come from the routines of the given Emergency Level. Hospitalized people stay in one place for the whole day,
+        so their routine changes may only split a block where it was not necessary. If people enter or leave a location with
+        limited capacity, the locations where the people that do not fit are sent (Outdoors, their homes) change too.
+        '''
+        if (level in self.blocks):
+            return self.blocks[level]
+
+        population = self.population
+        routineType = population.levelType[LEVEL_ROUTINES[level]]
+        location = (self.offsets[routineType] + np.where(routineType == HOUSE, population.houseID[:, None], np.where(routineType == HOSPITAL, 0, population.defaultID))).astype(np.int32)
+
+        changed = np.zeros((24, self.numberOfLocations), dtype=bool)
+        changed[0] = True
+        for hour in range(1, 24):
+            movers = np.flatnonzero(location[:, hour] != location[:, hour-1])
+            changed[hour, location[movers, hour-1]] = True
+            changed[hour, location[movers, hour]] = True
+
+            limited = np.flatnonzero(changed[hour] & self.isLimited)
+            if (len(limited) > 0):
+                changed[hour, self.offsets[OUTDOORS]] = True
+                affected = np.isin(location[:, hour-1], limited) | np.isin(location[:, hour], limited)
+                changed[hour, self.offsets[HOUSE] + population.houseID[affected]] = True
+
+        blocks = np.zeros((24, self.numberOfLocations), dtype=np.int8)
+        nextChange = np.full(self.numberOfLocations, 24)
+        for hour in range(23, -1, -1):
+            blocks[hour] = np.where(changed[hour], nextChange - hour, 0)
+            nextChange = np.where(changed[hour], hour, nextChange)
+        self.blocks[level] = blocks
+        return blocks
+
+
+    def Unplaced(self, level):
+        '''
+        Returns the number of person-hours of a day at the given Emergency Level that people spend outdoors or at home because their
+        Transportation or Entertainment place is full (see ApplyCapacities): the visitors over the capacity of each place, for each hour.
+        The number of people whose routine of the Emergency Level leads to each place is computed once; the hospitalized people, whose
+        routine is replaced, are subtracted.
+        '''
+        population = self.population
+        routines = population.levelType[LEVEL_ROUTINES[level]]
+        if (level not in self.demand):
+            people, hours = np.nonzero(np.isin(routines, (TRANSPORTATION, ENTERTAINMENT)))
+            self.demand[level] = self.Demand(routines, people, hours)
+
+        demand = self.demand[level]
+        hospitalized = np.flatnonzero(population.isHospitalized)
+        if (len(hospitalized) > 0):
+            people, hours = np.nonzero(np.isin(routines[hospitalized], (TRANSPORTATION, ENTERTAINMENT)))
+            demand = demand - self.Demand(routines, hospitalized[people], hours)
+
+        isTransportation = self.limited >= self.offsets[TRANSPORTATION] # The Entertainment places come first (location code order).
+        capacity = np.where(isTransportation, Transportation.Capacity(level), Entertainment.Capacity(level))
+        return int(np.maximum(demand - capacity, 0).sum())
+
+
+    def Demand(self, routines, people, hours):
+        '''
+        Returns the (24, number of Transportation and Entertainment places) number of the given (person, hour) routine entries at each place.
+        '''
+        location = self.offsets[routines[people, hours]] + self.population.defaultID[people, hours]
+        key = hours * len(self.limited) + np.searchsorted(self.limited, location)
+        return np.bincount(key, minlength=24 * len(self.limited)).reshape(24, len(self.limited))
+
+
+    def CountInfectious(self, hour):
+        '''
+        Returns the number of Infectious people whose routine leads to each location for the given hour (from the infectious index).
+        '''
+        return np.bincount(self.Locations(hour, self.compartments.Infectious())[1], minlength=self.numberOfLocations)
+
+
+    def Fill(self, hour, level):
+        '''
+        Places every person in their location (see Model.FillBuildings).
+        '''
+        version = len(self.population.routineChanges)
+        routineType, placed = self.Locations(hour)
+        self.ApplyCapacities(placed, np.arange(len(placed)), routineType, level)
+
+        visitors = np.bincount(placed, minlength=self.numberOfLocations)
+        order = np.argsort(placed, kind="stable").astype(np.int32)
+        return Occupancy(order, visitors, version)
+
+
+    def Patch(self, occupancy, hour, level):
+        '''
+        Moves the people whose routine changed since the occupancy was filled (or last patched) to their current location.
+
+        If one of them leaves or joins a location with limited capacity, the people of that location are placed again
+        (in the order of their IDs, same as Fill), so someone who had to move by foot or stay at home may take the free place.
+        '''
+        people = self.population.ChangedSince(occupancy.version)
+        routineType, location = self.Locations(hour, people)
+        oldLocation = occupancy.Location(people)
+
+        limited = np.unique(np.concatenate((oldLocation[self.isLimited[oldLocation]], location[self.isLimited[location]])))
+        if (len(limited) > 0):
+            allTypes, allLocations = self.Locations(hour)
+            members = np.flatnonzero(np.isin(allLocations, limited)) # People whose routine leads to those locations.
+            placed = allLocations[members]
+            self.ApplyCapacities(placed, members, allTypes[members], level)
+
+            isMember = np.isin(people, members)
+            location[isMember] = placed[np.searchsorted(members, people[isMember])]
+            moved = (placed != occupancy.Location(members)) & ~np.isin(members, people)
+            people = np.concatenate((people, members[moved]))
+            location = np.concatenate((location, placed[moved]))
+            oldLocation = occupancy.Location(people)
+
+        keep = np.ones(len(occupancy.order), dtype=bool)
+        keep[occupancy.position[people]] = False
+        order = occupancy.order[keep]
+        visitors = occupancy.visitors - np.bincount(oldLocation, minlength=self.numberOfLocations)
+
+        # The visitors of each location stay sorted by ID (same order as Fill), so the moved people are inserted at their sorted position.
+        movedOrder = np.lexsort((people, location))
+        size = len(self.population)
+        sortKey = np.repeat(np.arange(self.numberOfLocations, dtype=np.int64), visitors) * size + order
+        insertAt = np.searchsorted(sortKey, location[movedOrder].astype(np.int64) * size + people[movedOrder])
+        occupancy.order = np.insert(order, insertAt, people[movedOrder]).astype(np.int32)
+        occupancy.visitors = visitors + np.bincount(location, minlength=self.numberOfLocations)
+        occupancy.version = len(self.population.routineChanges)
+        occupancy.Index()
+
+        # The counts are up to date (see Get): only the moved Susceptible people change location, and the routines of the Infectious may have changed.
+        isSusceptible = self.compartments.state[people] == SUSCEPTIBLE
+        np.subtract.at(occupancy.susceptible, oldLocation[isSusceptible], 1)
+        np.add.at(occupancy.susceptible, location[isSusceptible], 1)
+        occupancy.infectious = self.CountInfectious(hour)
+
+
+
+    def ApplyCapacities(self, placed, people, routineType, level):
+        '''
+        Moves the people that do not fit in Transportation (move by foot) or Entertainment (stay at home).
+
+        placed: Flat location index of the given people (modified in place).
+        '''
+        transportation = np.flatnonzero(routineType == TRANSPORTATION)
+        Overflow(placed, transportation, Transportation.Capacity(level), self.offsets[OUTDOORS])
+        entertainment = np.flatnonzero(routineType == ENTERTAINMENT)
+        Overflow(placed, entertainment, Entertainment.Capacity(level), self.offsets[HOUSE] + self.population.houseID[people[entertainment]])
+
+
+
+def Overflow(placed, indices, capacity, fallback):
+    '''
+    Moves the people that do not fit in their location to the fallback location.
+    Locations are filled in the order of the people's IDs, same as Model.FillBuildings.
+
+    placed: Flat location index of each person (modified in place).
+    indices: Indices (in "placed") of the people in locations with limited capacity.
+    fallback: Flat location index (or array with one index per person in "indices") used when the location is full.
+    '''
+    if (len(indices) == 0):
+        return
+    order = np.argsort(placed[indices], kind="stable")
+    sortedLocations = placed[indices][order]
+    groupStart = np.flatnonzero(np.r_[True, sortedLocations[1:] != sortedLocations[:-1]])
+    rank = np.arange(len(order)) - np.repeat(groupStart, np.diff(np.r_[groupStart, len(order)]))
+
+    full = order[rank >= capacity]
+    placed[indices[full]] = fallback if np.isscalar(fallback) else fallback[full]
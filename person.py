@@ -1,8 +1,13 @@
 import numpy as np
-import random
-from scipy.stats import truncnorm
 from town import Town
 
+AGEGROUPS = ["Underage", "Young Adult", "Adult", "Middle Aged", "Elderly"] # Index of each age group = its integer code.
+HEALTH_FACTORS = np.array([1, 1, 1.5, 3, 9.67]) # Health factor of each age group (see CreateHealthFactor).
+
+# Truncated normal distributions of the hygiene and legality factors.
+HYGIENE_DISTRIBUTION = {"mean": 1.0, "sd": 0.7, "low": 0.1, "upp": 5}
+LEGALITY_DISTRIBUTION = {"mean": 1.0, "sd": 0.3, "low": 0.5, "upp": 2}
+
 class Person:
     '''
     Class that represents each resident of the town.
@@ -18,27 +23,34 @@ class Person:
     Health Factor: Determines the person's likelihood of being hospitalized during their illness period. It is entirely age-dependent.
     Hygiene Factor: Affects the person's likelihood to transmit and receive the virus.
     Legality Factor: Determines the person's likelihood to obey the government's protection measures during the pandemic.
+    rng: numpy.random.Generator used for the person's random choices (a new one with a random seed if not given).
     '''
 
-    def __init__(self, ID=None, houseID=None, agegroup=None, town=None):
+    def __init__(self, ID=None, houseID=None, agegroup=None, town=None, hygieneFactor=None, legalityFactor=None, rng=None):
         # Basic characteristics
         self.ID = ID
         self.houseID = houseID
         self.agegroup = agegroup
         self.town = town
+        self.rng = rng if (rng is not None) else np.random.default_rng()
         
         self.isHospitalized = False
         
-        # Personality characteristics (Health/Hygiene/Legality factor).
+        # Personality characteristics (Health/Hygiene/Legality factor). Hygiene and legality factors may be given if they were drawn in bulk (see Population.Generate).
         self.healthFactor = self.CreateHealthFactor(self)
         
-        normalDistGenerator = self.get_truncated_normal(mean=1.0, sd=0.7, low=0.1, upp=5)
-        self.hygieneFactor = normalDistGenerator.rvs()
+        if (hygieneFactor is None):
+            normalDistGenerator = self.get_truncated_normal(**HYGIENE_DISTRIBUTION)
+            hygieneFactor = normalDistGenerator.rvs(random_state=self.rng)
+        self.hygieneFactor = hygieneFactor
 
-        normalDistGenerator =  self.get_truncated_normal(mean=1.0, sd=0.3, low=0.5, upp=2)
-        self.legalityFactor = normalDistGenerator.rvs()
+        if (legalityFactor is None):
+            normalDistGenerator =  self.get_truncated_normal(**LEGALITY_DISTRIBUTION)
+            legalityFactor = normalDistGenerator.rvs(random_state=self.rng)
+        self.legalityFactor = legalityFactor
         
         self.defaultRoutine = self.CreateRoutine(self)
+        self.levelRoutines = self.CreateLevelRoutines() # The person's routine for each Emergency Level (0-3), created once.
         self.routine = self.defaultRoutine # The person's active routine. It is the same as defaultRoutine under normal circumstances but might change with certain conditions (e.g. Hospitalization).
         self.interactions = self.ExpectedDailyInteractions(self.routine) # The person's expected interactions per hour of the day.
 
@@ -81,17 +93,17 @@ class Person:
         routine[8] = ['Outdoors', 0]
         
         # School in the morning
-        schoolID = random.randint(0, len(person.town.schools)) - 1
+        schoolID = self.RandInt(0, len(person.town.schools)) - 1
         for i in range(9, 15):
             routine[i] = ['School', schoolID]
             
         routine[15] = ['Outdoors', 0]
         
-        if (random.randint(1,100)<84): # 83% chance to participate in extracurricular activities
-            extracurricularID = random.randint(0, len(person.town.extracurriculars)) - 1
-            starting_hour = random.randint(16,20)
-            routine[starting_hour-1] = ['Transportation', random.randint(0, len(person.town.transportations)) - 1] # Transportation from home to activity
-            routine[starting_hour+3] = ['Transportation', random.randint(0, len(person.town.transportations)) - 1] # Transportation from activity to home
+        if (self.RandInt(1,100)<84): # 83% chance to participate in extracurricular activities
+            extracurricularID = self.RandInt(0, len(person.town.extracurriculars)) - 1
+            starting_hour = self.RandInt(16,20)
+            routine[starting_hour-1] = ['Transportation', self.RandInt(0, len(person.town.transportations)) - 1] # Transportation from home to activity
+            routine[starting_hour+3] = ['Transportation', self.RandInt(0, len(person.town.transportations)) - 1] # Transportation from activity to home
             for i in range(starting_hour, starting_hour+3):
                 routine[i] = ['Extracurricular', extracurricularID]
                 
@@ -104,21 +116,21 @@ class Person:
         for i in range(24): # Default
             routine[i] = ['House', person.houseID]
             
-        if (random.randint(1,100)<64): # 63% chance to attend college/university
-            schoolID = random.randint(0, len(person.town.schools)) - 1
+        if (self.RandInt(1,100)<64): # 63% chance to attend college/university
+            schoolID = self.RandInt(0, len(person.town.schools)) - 1
             endtime = 14
             for i in range(9, endtime+1):
                 routine[i] = ['School', schoolID]
         else: # 37% chance to work
-            workplaceID = random.randint(0, len(person.town.workplaces)) - 1
+            workplaceID = self.RandInt(0, len(person.town.workplaces)) - 1
             endtime = 17
             for i in range(9, endtime+1):
                 routine[i] = ['Workplace', workplaceID]
 
         self.Transport(routine, person.town, 8, endtime+1)
 
-        entertainmentID = random.randint(0, len(person.town.entertainments)) - 1
-        starting_hour = random.randint(18,20)
+        entertainmentID = self.RandInt(0, len(person.town.entertainments)) - 1
+        starting_hour = self.RandInt(18,20)
         for i in range(starting_hour, starting_hour+3): # 3 afternoon/night hours for entertainment
             routine[i] = ['Entertainment', entertainmentID]
         
@@ -132,15 +144,15 @@ class Person:
             routine[i] = ['House', person.houseID]
             
         # Work
-        workplaceID = random.randint(0, len(person.town.workplaces)) - 1
+        workplaceID = self.RandInt(0, len(person.town.workplaces)) - 1
         for i in range(9, 18):
             routine[i] = ['Workplace', workplaceID]
      
         self.Transport(routine, person.town, 8, 18)
         
-        if (random.randint(1,10)<9): # 80% chance for nighttime enternainment
-            entertainmentID = random.randint(0, len(person.town.entertainments)) - 1
-            starting_hour = random.randint(19,20)
+        if (self.RandInt(1,10)<9): # 80% chance for nighttime enternainment
+            entertainmentID = self.RandInt(0, len(person.town.entertainments)) - 1
+            starting_hour = self.RandInt(19,20)
             for i in range(starting_hour, starting_hour+3): # 3 afternoon/night hours for entertainment
                 routine[i] = ['Entertainment', entertainmentID]
                 
@@ -156,15 +168,15 @@ class Person:
             routine[i] = ['House', person.houseID]
 
         # Work
-        workplaceID = random.randint(0, len(person.town.workplaces)) - 1
+        workplaceID = self.RandInt(0, len(person.town.workplaces)) - 1
         for i in range(9, 18):
             routine[i] = ['Workplace', workplaceID]
 
         self.Transport(routine, person.town, 8, 18)
         
-        if (random.randint(1,2)==1): # 50% chance for nighttime enternainment
-            entertainmentID = random.randint(0, len(person.town.entertainments)) - 1
-            starting_hour = random.randint(19,22)
+        if (self.RandInt(1,2)==1): # 50% chance for nighttime enternainment
+            entertainmentID = self.RandInt(0, len(person.town.entertainments)) - 1
+            starting_hour = self.RandInt(19,22)
             for i in range(starting_hour, starting_hour+2): # 2 afternoon/night hours for entertainment
                 routine[i] = ['Entertainment', entertainmentID]
         
@@ -177,7 +189,7 @@ class Person:
         for i in range(24): # Default
             routine[i] = ['House', person.houseID]
             
-        starting_hour = random.randint(10,18)
+        starting_hour = self.RandInt(10,18)
         for i in range (starting_hour, starting_hour+4): # Morning or afternoon walk
             routine[i] = ['Outdoors', 0]
             
@@ -216,54 +228,67 @@ class Person:
         
         (Source: https://stackoverflow.com/questions/36894191/how-to-get-a-normal-distribution-within-a-range-in-numpy)
         '''
+        from scipy.stats import truncnorm # Imported when needed, so that scipy is not loaded with the module.
         return truncnorm((low-mean)/sd, (upp-mean)/sd, loc=mean, scale=sd)
 
 
 
+    def RandInt(self, a, b):
+        '''
+        Random integer N such that a <= N <= b (same as random.randint), drawn from the person's Generator.
+        '''
+        return int(self.rng.integers(a, b+1))
+
+
+
     def Transport(self, routine, town, starttime, endtime):
         '''
         Determines when the person uses transportations means (before or after the activity) and updates the routine.
         '''
-        if (random.randint(1,2)==1): # 50/50 chance
+        if (self.RandInt(1,2)==1): # 50/50 chance
             routine[starttime] = ['Outdoors', 0]
-            routine[endtime] = ['Transportation', random.randint(0, len(town.transportations)) - 1]
+            routine[endtime] = ['Transportation', self.RandInt(0, len(town.transportations)) - 1]
         else:
             routine[endtime] = ['Outdoors', 0]
-            routine[starttime] = ['Transportation', random.randint(0, len(town.transportations)) - 1]   
+            routine[starttime] = ['Transportation', self.RandInt(0, len(town.transportations)) - 1]   
         return routine
         
 
 
-    def ModifyRoutine(self, level):
+    def CreateLevelRoutines(self):
         '''
-        Modifies the person's routine whenever the Emergency Level changes in order to abide with the government's laws.
+        Creates the person's routine for each Emergency Level (0-3) in order to abide with the government's laws.
+        Levels 0 and 1 use the default routine. Whether the person works from home in level 2 is decided once.
         '''
-        if (level < 2): # People return to their default routines.
-            self.routine = self.defaultRoutine
-            return
-    
-        modifiedRoutine = []
+        worksFromHome = (self.RandInt(1,2)==1) # Working from home. 50% chance in level 2, 100% chance in level 3.
+        level2Routine = []
+        level3Routine = []
         
         for activity in self.defaultRoutine:
-            if (activity[0] == 'School' or activity[0] == 'Extracurricular'):
-                if (level == 3):  # 100% chance for distance learning in level 3.
-                    modifiedRoutine.append(['House', self.houseID])
-                else:
-                    modifiedRoutine.append(activity)
-            elif (activity[0] == 'Workplace'): # Working from home. 50% chance in level 2, 100% chance in level 3.
-                if (level == 2):
-                    if (random.randint(1,2)==1):
-                        modifiedRoutine.append(['House', self.houseID])
-                    else:
-                        modifiedRoutine.append(activity)
-                elif (level == 3):
-                    modifiedRoutine.append(['House', self.houseID])
+            if (activity[0] == 'School' or activity[0] == 'Extracurricular'): # 100% chance for distance learning in level 3.
+                level2Routine.append(activity)
+                level3Routine.append(['House', self.houseID])
+            elif (activity[0] == 'Workplace'):
+                if (worksFromHome):
+                    level2Routine.append(['House', self.houseID])
                 else:
-                    modifiedRoutine.append(activity)
+                    level2Routine.append(activity)
+                level3Routine.append(['House', self.houseID])
             else: # Any other activity works as normal in any level.
-                modifiedRoutine.append(activity)
+                level2Routine.append(activity)
+                level3Routine.append(activity)
                 
-        self.routine = modifiedRoutine
+        return [self.defaultRoutine, self.defaultRoutine, level2Routine, level3Routine]
+
+
+
+    def ModifyRoutine(self, level):
+        '''
+        Switches to the person's routine for the given Emergency Level.
+        Hospitalized people keep their routine until they are discharged.
+        '''
+        if (not self.isHospitalized):
+            self.routine = self.levelRoutines[level]
         
     
     
@@ -274,6 +299,14 @@ class Person:
             self.routine = [['Hospital', 0]] * 24
         
         self.isHospitalized = True
+
+
+    def Discharge(self, level):
+        '''
+        The person leaves the hospital and returns to their routine for the current Emergency Level.
+        '''
+        self.isHospitalized = False
+        self.ModifyRoutine(level)
     
     
     
@@ -330,7 +363,7 @@ class Person:
         Auxiliary function for "IsWearingMask" that takes into consideration the person's legalityFactor.
         '''
         obedience_chance = 1 if (self.legalityFactor >= 1) else self.legalityFactor        
-        return (random.random() <= obedience_chance)
+        return (self.rng.random() <= obedience_chance)
 
     
     
@@ -0,0 +1,314 @@
+import copy
+import numpy as np
+from person import Person, AGEGROUPS, HEALTH_FACTORS, HYGIENE_DISTRIBUTION, LEGALITY_DISTRIBUTION
+from town import LOCATION_NAMES, HOUSE, HOSPITAL, Hospital
+from routines import CreateRoutines, CreateLevelRoutines, INTERACTIONS_PER_HOUR, LEVEL_ROUTINES
+
+# Percentages based on studies.
+FAMILY_SIZES = [1, 2, 3, 4, 5]
+FAMILY_SIZE_PROBABILITIES = [0.325, 0.312, 0.163, 0.136, 0.064]
+AGEGROUP_PROBABILITIES = [0.2035, 0.054, 0.192, 0.349, 0.2015] # Same order as person.AGEGROUPS
+
+
+
+def DrawFamilySizes(numberOfPeople, rng):
+    '''
+    Returns the number of members of each family, so that the sizes add up to numberOfPeople.
+    Same rule as drawing one family at a time: a random size while at least 5 people are left, then one family with the rest.
+    rng: numpy.random.Generator
+    '''
+    sizes = np.zeros(0, dtype=np.int64)
+    while (sizes.sum() <= numberOfPeople - 5):
+        sizes = np.concatenate((sizes, rng.choice(FAMILY_SIZES, numberOfPeople//2 + 1, p=FAMILY_SIZE_PROBABILITIES)))
+
+    createdBefore = np.cumsum(sizes) - sizes # People created before each family.
+    sizes = sizes[createdBefore <= numberOfPeople - 5]
+    remaining = numberOfPeople - sizes.sum()
+    if (remaining > 0):
+        sizes = np.append(sizes, remaining)
+    return sizes
+
+
+def DrawTruncatedNormal(size, mean, sd, low, upp, rng):
+    '''
+    Draws "size" values from a normal distribution truncated to [low, upp] (see Person.get_truncated_normal).
+    Values outside the bounds are drawn again, which gives the same distribution as scipy.stats.truncnorm without importing scipy.
+    '''
+    values = rng.normal(mean, sd, size)
+    outside = np.flatnonzero((values < low) | (values > upp))
+    while (len(outside) > 0):
+        values[outside] = rng.normal(mean, sd, len(outside))
+        outside = outside[(values[outside] < low) | (values[outside] > upp)]
+    return values
+
+
+
+class Population:
+    '''
+    Stores the characteristics of all the town's residents as NumPy columns (one row per person) instead of one "Person" object each.
+
+    healthFactor, hygieneFactor, legalityFactor: float32 columns.
+    agegroup: int8 code (index in person.AGEGROUPS).
+    houseID: int32 column.
+    isHospitalized: bool column. hospitalLocation is the location code that replaces the routine of hospitalized people (Hospital, or House if the hospital was full).
+    levelType: (3, N, 24) location codes of the routines for each Emergency Level (see routines.CreateLevelRoutines). defaultType is levelType[0].
+    defaultID: (N, 24) location IDs of the default routine. "House" entries of every routine refer to the person's home.
+
+    The routine of each Emergency Level is created once, so a level change only selects a different one (see SetEmergencyLevel).
+    The hourly interactions are not stored, they are looked up from the location codes (see Interactions).
+    population[ID] returns a "Person"-like view of a row, for code that works with "Person" objects (People() returns a list with all of them).
+    rng: numpy.random.Generator used to draw the characteristics and the routines (see Model.rng).
+    '''
+
+    def __init__(self, size, town, rng):
+        self.size = size
+        self.town = town
+        self.rng = rng
+
+        self.healthFactor = np.zeros(size, dtype=np.float32)
+        self.hygieneFactor = np.zeros(size, dtype=np.float32)
+        self.legalityFactor = np.zeros(size, dtype=np.float32)
+        self.agegroup = np.zeros(size, dtype=np.int8)
+        self.houseID = np.zeros(size, dtype=np.int32)
+        self.isHospitalized = np.zeros(size, dtype=bool)
+        self.hospitalLocation = np.full(size, HOSPITAL, dtype=np.int8)
+
+        self.levelType = np.zeros((3, size, 24), dtype=np.int8)
+        self.defaultType = self.levelType[0]
+        self.defaultID = np.zeros((size, 24), dtype=np.int32)
+
+        self.emergencyLevel = 0
+        self.routineChanges = [] # IDs of the people whose routine changed (hospitalization/discharge), one array per change.
+        self.views = None
+
+
+    def __len__(self):
+        return self.size
+
+
+    def __getitem__(self, ID):
+        return PersonView(self, ID)
+
+
+    def Generate(self, houseIDs):
+        '''
+        Draws the age group, health, hygiene and legality factor of every person at once.
+
+        houseIDs: House ID of each person.
+        '''
+        self.houseID[:] = houseIDs
+        self.agegroup[:] = self.rng.choice(len(AGEGROUPS), self.size, p=AGEGROUP_PROBABILITIES)
+        self.healthFactor[:] = HEALTH_FACTORS[self.agegroup]
+        self.hygieneFactor[:] = DrawTruncatedNormal(self.size, **HYGIENE_DISTRIBUTION, rng=self.rng)
+        self.legalityFactor[:] = DrawTruncatedNormal(self.size, **LEGALITY_DISTRIBUTION, rng=self.rng)
+
+
+    def CreateRoutines(self):
+        '''
+        Creates the routines of every person for every Emergency Level at once, based on their age group (see routines.CreateRoutines).
+        '''
+        defaultType, self.defaultID[:] = CreateRoutines(self.agegroup, self.houseID, self.town.LocationCounts(), self.rng)[:2] # The interactions are looked up when needed (see Interactions).
+        self.levelType[:] = CreateLevelRoutines(defaultType, self.rng)
+
+
+    def People(self):
+        '''
+        Returns a list with a "Person"-like view of each row. The list is created on the first call.
+        '''
+        if (self.views is None):
+            self.views = [PersonView(self, ID) for ID in range(self.size)]
+        return self.views
+
+
+
+    def Fork(self, rng):
+        '''
+        Returns a copy of the population for a branch of the simulation (see Model.Fork).
+        The characteristics and the routines do not change during a simulation, so they are shared with the copy (and made read-only).
+        Only the hospitalization columns and the list of routine changes are copied.
+        '''
+        for column in (self.healthFactor, self.hygieneFactor, self.legalityFactor, self.agegroup, self.houseID, self.levelType, self.defaultType, self.defaultID):
+            column.flags.writeable = False
+
+        population = copy.copy(self)
+        population.rng = rng
+        population.isHospitalized = self.isHospitalized.copy()
+        population.hospitalLocation = self.hospitalLocation.copy()
+        population.routineChanges = list(self.routineChanges)
+        population.views = None
+        return population
+
+
+    def SetEmergencyLevel(self, level):
+        '''
+        Selects the precomputed routines of the given Emergency Level. Hospitalized people keep their routine.
+        '''
+        self.emergencyLevel = level
+
+
+    def Hospitalize(self, people, hospitalIsFull):
+        '''
+        Replaces the entire routine of the given people with "Hospital" entries (or "House" entries if the hospital is full) until they are discharged.
+        '''
+        self.hospitalLocation[people] = HOUSE if hospitalIsFull else HOSPITAL
+        self.isHospitalized[people] = True
+        self.routineChanges.append(np.atleast_1d(people).copy())
+
+
+    def Discharge(self, people):
+        '''
+        The given people return to their routine for the current Emergency Level.
+        '''
+        self.isHospitalized[people] = False
+        self.routineChanges.append(np.atleast_1d(people).copy())
+
+
+    def ChangedSince(self, version):
+        '''
+        Returns the IDs of the people whose routine changed after the first "version" changes.
+        '''
+        return np.unique(np.concatenate(self.routineChanges[version:]))
+
+
+    def RoutineType(self, hour, people=slice(None)):
+        '''
+        Returns the location code of the active routine of every person (or the given people) for the given hour.
+        '''
+        routineType = self.levelType[LEVEL_ROUTINES[self.emergencyLevel], people, hour].copy()
+        hospitalized = self.isHospitalized[people]
+        routineType[hospitalized] = self.hospitalLocation[people][hospitalized]
+        return routineType
+
+
+    def HospitalOccupancy(self):
+        '''
+        Returns the number of Hospital visitors during the last hour of the day (the count that Model.ExecEvents compares with Hospital.capacity).
+        '''
+        return int(np.count_nonzero(self.RoutineType(23) == HOSPITAL))
+
+
+    def RoutineID(self, hour, routineType, people=slice(None)):
+        '''
+        Returns the location IDs that correspond to the given location codes (see RoutineType) for the given hour.
+        '''
+        return np.where(routineType == HOUSE, self.houseID[people], np.where(routineType == HOSPITAL, 0, self.defaultID[people, hour]))
+
+
+    def Activity(self, ID, hour, default=False):
+        '''
+        Returns [location, ID] of a single person's active (or default) routine for the given hour.
+        '''
+        if (default):
+            code = self.defaultType[ID, hour]
+        elif (self.isHospitalized[ID]):
+            code = self.hospitalLocation[ID]
+        else:
+            code = self.levelType[LEVEL_ROUTINES[self.emergencyLevel], ID, hour]
+
+        if (code == HOUSE):
+            return ['House', int(self.houseID[ID])]
+        elif (code == HOSPITAL):
+            return ['Hospital', 0]
+        return [LOCATION_NAMES[code], int(self.defaultID[ID, hour])]
+
+
+    def Interactions(self, people=slice(None)):
+        '''
+        Returns the expected interactions per hour ((N, 24) matrix) of the given people, based on their default routine.
+        '''
+        return INTERACTIONS_PER_HOUR[self.defaultType[people]]
+
+
+    def nbytes(self):
+        '''
+        Memory used by the columns, in bytes.
+        '''
+        return sum(column.nbytes for name, column in vars(self).items() if isinstance(column, np.ndarray) and name != "defaultType") # defaultType is a view of levelType.
+
+
+
+class RoutineView:
+    '''
+    Read-only list-like view of a person's active (or default) routine. routine[hour] returns [location, ID].
+    '''
+
+    def __init__(self, population, ID, default=False):
+        self.population = population
+        self.ID = ID
+        self.default = default
+
+    def __len__(self):
+        return 24
+
+    def __getitem__(self, hour):
+        return self.population.Activity(self.ID, hour, self.default)
+
+    def __iter__(self):
+        return (self[hour] for hour in range(24))
+
+
+
+class PersonView(Person):
+    '''
+    "Person"-like view of a row of a Population.
+    The characteristics are read from (and written to) the population's columns, so the "Person" methods (IsWearingMask, Hospitalize, Discharge etc.) can be used.
+    The routine follows the population's Emergency Level (see Population.SetEmergencyLevel), so ModifyRoutine is not needed.
+    '''
+
+    def __init__(self, population, ID):
+        self.population = population
+        self.ID = ID
+
+    @property
+    def town(self):
+        return self.population.town
+
+    @property
+    def rng(self):
+        return self.population.rng
+
+    @property
+    def houseID(self):
+        return int(self.population.houseID[self.ID])
+
+    @property
+    def agegroup(self):
+        return AGEGROUPS[self.population.agegroup[self.ID]]
+
+    @property
+    def healthFactor(self):
+        return float(self.population.healthFactor[self.ID])
+
+    @property
+    def hygieneFactor(self):
+        return float(self.population.hygieneFactor[self.ID])
+
+    @property
+    def legalityFactor(self):
+        return float(self.population.legalityFactor[self.ID])
+
+    @property
+    def isHospitalized(self):
+        return bool(self.population.isHospitalized[self.ID])
+
+    @property
+    def defaultRoutine(self):
+        return RoutineView(self.population, self.ID, default=True)
+
+    @property
+    def routine(self):
+        return RoutineView(self.population, self.ID)
+
+    @property
+    def interactions(self):
+        return self.population.Interactions(self.ID)
+
+    def ModifyRoutine(self, level):
+        return # The routine follows the population's Emergency Level.
+
+    def Hospitalize(self):
+        # The Hospital's visitor list is only filled while it is active (see Model.FillBuildings), so the occupancy is counted from the routines.
+        self.population.Hospitalize(self.ID, self.population.HospitalOccupancy() >= Hospital.capacity)
+
+    def Discharge(self, level):
+        self.population.Discharge(self.ID)
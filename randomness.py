@@ -0,0 +1,67 @@
+'''
+Random number generation.
+Each Model owns one numpy.random.Generator, created from the model's seed and passed to every component that draws random
+numbers (population, routines, engines), so the same seed gives the same results.
+'''
+
+import numpy as np
+
+
+def CreateGenerator(seed=None):
+    '''
+    Returns a numpy.random.Generator for the given seed (integer, numpy.random.SeedSequence or Generator). None gives a random seed.
+    '''
+    if (isinstance(seed, np.random.Generator)):
+        return seed
+    return np.random.default_rng(seed)
+
+
+def SpawnSeeds(seed, number):
+    '''
+    Returns "number" independent child seeds (numpy.random.SeedSequence) of the given seed, e.g. one for each parallel run.
+    The i-th child is always the same, whatever the number of processes used.
+    '''
+    if (not isinstance(seed, np.random.SeedSequence)):
+        seed = np.random.SeedSequence(seed)
+    return seed.spawn(number)
+
+
+def SpawnGenerators(rng, number):
+    '''
+    Returns "number" independent child Generators of the given Generator (e.g. for worker processes).
+    '''
+    return rng.spawn(number)
+
+
+
+class RandomBuffer:
+    '''
+    Uniform random numbers in [0, 1) drawn from a Generator in blocks, for loops that use one number at a time (see Model.Interaction).
+    Drawing a block in a single call is much faster than calling the Generator for every number.
+    '''
+
+    def __init__(self, rng, blockSize=65536):
+        self.rng = rng
+        self.blockSize = blockSize
+        self.block = []
+        self.index = 0
+
+
+    def Random(self):
+        if (self.index == len(self.block)):
+            self.block = self.rng.random(self.blockSize).tolist()
+            self.index = 0
+        value = self.block[self.index]
+        self.index += 1
+        return value
+
+
+    def Sample(self, items, k):
+        '''
+        Returns k distinct random elements of the list "items" (same as random.sample). The list is shuffled in place.
+        '''
+        n = len(items)
+        for i in range(k): # Partial Fisher-Yates shuffle.
+            j = i + int(self.Random() * (n - i))
+            items[i], items[j] = items[j], items[i]
+        return items[:k]
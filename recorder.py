@@ -0,0 +1,164 @@
+'''
+Daily results of a simulation, stored as columns of preallocated NumPy arrays (one row per day, starting with day 0).
+
+Each row holds the state at the start of the day and what happened during it:
+- S, I, R: Number of people in each state (exact counts, the percentages are computed from them).
+- emergencyLevel: The day's Emergency Level.
+- newInfections by age group and by kind of location where the infection happened. The "Other" column counts the infections
+  without a location: the starting infectious people, infections from other towns (see Model.ImportInfections) and infections
+  outside the home on the days that are drawn at once (see Model.hybridThreshold).
+- hospitalOccupancy: Hospitalized people in the hospital at the start of the day.
+- hospitalOverflow: People that needed hospitalization during the day but stayed at home because the hospital was full.
+- capacityOverflow: Person-hours of the day that people spent outdoors or at home because their Transportation or Entertainment
+  place was full (see occupancy.OccupancyCache.Unplaced).
+
+The arrays are sized from the number of days of the simulation and grow (doubling) if the simulation is extended,
+so recording a day costs a few array writes.
+
+Example:
+    model = Model(100000, daysOfSimulation=120, headless=True, seed=1)
+    model.Run(120)
+    model.recorder.SaveCSV("results.csv")
+    columns = model.recorder.Columns() # Dictionary of arrays, e.g. columns["newInfections.Workplace"].
+'''
+
+import numpy as np
+from person import AGEGROUPS
+from town import LOCATION_NAMES
+
+OTHER = len(LOCATION_NAMES) # Location column of the infections without a location.
+INFECTION_LOCATIONS = LOCATION_NAMES + ["Other"]
+
+
+class Recorder:
+    '''
+    numberOfPpl: Population size (for the percentages).
+    days: Number of days to allocate (rows for days 0 to "days").
+    '''
+
+    ARRAYS = ["counts", "emergencyLevels", "infectionsByAge", "infectionsByLocation", "hospitalOccupancy", "hospitalOverflow", "capacityOverflow"]
+
+    def __init__(self, numberOfPpl, days):
+        self.numberOfPpl = numberOfPpl
+        self.numberOfDays = 0 # Number of rows recorded.
+
+        self.counts = np.zeros((0, 3), dtype=np.int64)
+        self.emergencyLevels = np.zeros(0, dtype=np.int8)
+        self.infectionsByAge = np.zeros((0, len(AGEGROUPS)), dtype=np.int64)
+        self.infectionsByLocation = np.zeros((0, len(INFECTION_LOCATIONS)), dtype=np.int64)
+        self.hospitalOccupancy = np.zeros(0, dtype=np.int64)
+        self.hospitalOverflow = np.zeros(0, dtype=np.int64)
+        self.capacityOverflow = np.zeros(0, dtype=np.int64)
+        self.Reserve(days)
+
+
+    def Reserve(self, days):
+        '''
+        Makes room for the rows of days 0 to "days" (at least twice the current rows, so extending a simulation day by day stays cheap).
+        '''
+        rows = days + 1
+        allocated = len(self.emergencyLevels)
+        if (rows <= allocated):
+            return
+        rows = max(rows, 2 * allocated)
+        for name in self.ARRAYS:
+            array = getattr(self, name)
+            grown = np.zeros((rows,) + array.shape[1:], dtype=array.dtype)
+            grown[:allocated] = array
+            setattr(self, name, grown)
+
+
+    def StartDay(self, day, counts, emergencyLevel, hospitalOccupancy):
+        '''
+        Records the state at the start of the given day: S/I/R counts, Emergency Level and hospital occupancy.
+        '''
+        self.Reserve(day)
+        self.counts[day] = counts
+        self.emergencyLevels[day] = emergencyLevel
+        self.hospitalOccupancy[day] = hospitalOccupancy
+        self.numberOfDays = day + 1
+
+
+    def AddInfections(self, day, agegroups, locations):
+        '''
+        Counts new infections of the given day.
+
+        agegroups: Age group of each infected person (array).
+        locations: Location code of each infection (array, or one code for all of them, OTHER if unknown).
+        '''
+        self.infectionsByAge[day] += np.bincount(agegroups, minlength=len(AGEGROUPS))
+        if (np.isscalar(locations)):
+            self.infectionsByLocation[day, locations] += len(agegroups)
+        else:
+            self.infectionsByLocation[day] += np.bincount(locations, minlength=len(INFECTION_LOCATIONS))
+
+
+    def Copy(self):
+        '''
+        Returns an independent copy (see Model.Fork).
+        '''
+        recorder = Recorder(self.numberOfPpl, -1)
+        recorder.numberOfDays = self.numberOfDays
+        for name in self.ARRAYS:
+            setattr(recorder, name, getattr(self, name).copy())
+        return recorder
+
+
+    def Percentages(self):
+        '''
+        Returns the (days, 3) percentages of Susceptible, Infectious and Recovered people.
+        '''
+        return self.counts[:self.numberOfDays] / self.numberOfPpl * 100
+
+
+    def Columns(self):
+        '''
+        Returns the recorded days as a dictionary of 1-D arrays (column name: values), in a fixed order.
+        '''
+        days = self.numberOfDays
+        columns = {"day": np.arange(days), "S": self.counts[:days, 0], "I": self.counts[:days, 1], "R": self.counts[:days, 2],
+                   "emergencyLevel": self.emergencyLevels[:days]}
+        for index, name in enumerate(AGEGROUPS):
+            columns["newInfections." + name] = self.infectionsByAge[:days, index]
+        for index, name in enumerate(INFECTION_LOCATIONS):
+            columns["newInfections." + name] = self.infectionsByLocation[:days, index]
+        columns["hospitalOccupancy"] = self.hospitalOccupancy[:days]
+        columns["hospitalOverflow"] = self.hospitalOverflow[:days]
+        columns["capacityOverflow"] = self.capacityOverflow[:days]
+        return columns
+
+
+    def Row(self, day):
+        '''
+        Returns the given day as a dictionary (column name: int, same columns as Columns), e.g. for the sinks (see sinks.Sink).
+        '''
+        return {name: int(column[day]) for name, column in self.Columns().items()}
+
+
+    def SaveNPZ(self, path):
+        np.savez(path, **self.Columns())
+
+
+    def SaveCSV(self, path):
+        '''
+        Writes the columns as CSV with a header line. Every column is an integer, so the whole table is formatted
+        with a single format string.
+        '''
+        columns = self.Columns()
+        table = np.column_stack([column.astype(np.int64) for column in columns.values()])
+        rowFormat = ",".join(["%d"] * len(columns)) + "\n"
+        with open(path, "w") as file:
+            file.write(",".join(columns) + "\n")
+            file.write((rowFormat * len(table)) % tuple(table.ravel().tolist()))
+
+
+    def SaveParquet(self, path):
+        '''
+        Writes the columns as a Parquet file (requires pyarrow).
+        '''
+        try:
+            import pyarrow
+            import pyarrow.parquet
+        except ImportError:
+            raise ImportError("Saving Parquet files requires pyarrow to be installed.")
+        pyarrow.parquet.write_table(pyarrow.table(self.Columns()), path)
@@ -0,0 +1,145 @@
+'''
+Creates the daily routines of the whole population at once.
+The rules are the same as Person.CreateRoutineUnderage/YoungAdult/Adult/MiddleAged/Elderly and Person.Transport,
+but each random choice is drawn for all the people of an age group in a single call.
+'''
+
+import numpy as np
+from town import HOUSE, SCHOOL, WORKPLACE, ENTERTAINMENT, TRANSPORTATION, EXTRACURRICULAR, OUTDOORS
+
+UNDERAGE, YOUNG_ADULT, ADULT, MIDDLE_AGED, ELDERLY = range(5) # Age group codes (see person.AGEGROUPS).
+
+# Expected interactions per hour for each location code (same values as Person.ExpectedDailyInteractions).
+INTERACTIONS_PER_HOUR = np.array([0.448, 5, 8, 0, 7, 10, 5, 2], dtype=np.float32) # House, School, Workplace, Hospital, Entertainment, Transportation, Extracurricular, Outdoors
+
+LEVEL_ROUTINES = [0, 0, 1, 2] # Index of each Emergency Level's routine in the output of CreateLevelRoutines (levels 0 and 1 share the default routine).
+
+
+
+def CreateRoutines(agegroup, houseID, locationCounts, rng):
+    '''
+    agegroup: Age group code of each person.
+    houseID: House ID of each person.
+    locationCounts: Number of locations of each kind (see Town.LocationCounts).
+    rng: numpy.random.Generator used for every random choice.
+
+    Returns three (N, 24) arrays: location codes, location IDs and expected interactions for each hour of the day.
+    '''
+    size = len(agegroup)
+    routineType = np.full((size, 24), HOUSE, dtype=np.int8) # Default
+    routineID = np.repeat(np.asarray(houseID, dtype=np.int32)[:, None], 24, axis=1)
+    routine = (routineType, routineID, locationCounts, rng) # Passed to the helpers below.
+
+    CreateRoutineUnderage(routine, np.flatnonzero(agegroup == UNDERAGE))
+    CreateRoutineYoungAdult(routine, np.flatnonzero(agegroup == YOUNG_ADULT))
+    CreateRoutineAdult(routine, np.flatnonzero(agegroup == ADULT))
+    CreateRoutineMiddleAged(routine, np.flatnonzero(agegroup == MIDDLE_AGED))
+    CreateRoutineElderly(routine, np.flatnonzero(agegroup == ELDERLY))
+
+    return routineType, routineID, INTERACTIONS_PER_HOUR[routineType]
+
+
+
+def CreateLevelRoutines(routineType, rng):
+    '''
+    Creates the location codes of the routines for each Emergency Level from the default ones (same rules as Person.CreateLevelRoutines).
+    Level 2: 50% chance to work from home, drawn once per person. Level 3: distance learning and working from home.
+    The location IDs do not change, since "House" entries always refer to the person's home.
+
+    Returns a (3, N, 24) array: default routine (levels 0-1), level 2 and level 3 routine.
+    '''
+    worksFromHome = rng.integers(1, 3, len(routineType)) == 1
+    levelType = np.empty((3,) + routineType.shape, dtype=np.int8)
+    levelType[0] = routineType
+    levelType[1] = np.where((routineType == WORKPLACE) & worksFromHome[:, None], HOUSE, routineType)
+    levelType[2] = np.where(np.isin(routineType, [SCHOOL, EXTRACURRICULAR, WORKPLACE]), HOUSE, routineType)
+    return levelType
+
+
+
+def RandomLocation(routine, code, size):
+    '''
+    Draws a random location ID of the given kind for "size" people.
+    Same as random.randint(0, count) - 1, where -1 refers to the last location.
+    '''
+    count = routine[2][code]
+    return routine[3].integers(-1, count, size) % count
+
+
+def Chance(routine, percentage, size):
+    return routine[3].integers(1, 101, size) <= percentage
+
+
+def Assign(routine, people, startingHour, duration, code, locationID):
+    '''
+    Sets the given location for "duration" hours, starting at startingHour (number or one hour per person).
+    '''
+    if (len(people) == 0):
+        return
+    hours = np.asarray(startingHour)[..., None] + np.arange(duration)
+    hours = np.broadcast_to(hours, (len(people), duration))
+    routine[0][people[:, None], hours] = code
+    routine[1][people[:, None], hours] = np.broadcast_to(np.asarray(locationID)[..., None], (len(people), duration))
+
+
+def Transport(routine, people, starttime, endtime):
+    '''
+    50/50 chance to walk before the activity and use transportation after it, or the opposite.
+    '''
+    walkFirst = routine[3].integers(1, 3, len(people)) == 1
+    transportationID = RandomLocation(routine, TRANSPORTATION, len(people))
+    starttime = np.broadcast_to(starttime, len(people))
+    endtime = np.broadcast_to(endtime, len(people))
+    Assign(routine, people, np.where(walkFirst, starttime, endtime), 1, OUTDOORS, 0)
+    Assign(routine, people, np.where(walkFirst, endtime, starttime), 1, TRANSPORTATION, transportationID)
+
+
+
+def CreateRoutineUnderage(routine, people):
+    Assign(routine, people, 8, 1, OUTDOORS, 0)
+    Assign(routine, people, 9, 6, SCHOOL, RandomLocation(routine, SCHOOL, len(people))) # School in the morning
+    Assign(routine, people, 15, 1, OUTDOORS, 0)
+
+    people = people[Chance(routine, 83, len(people))] # 83% chance to participate in extracurricular activities
+    extracurricularID = RandomLocation(routine, EXTRACURRICULAR, len(people))
+    starting_hour = routine[3].integers(16, 21, len(people))
+    Assign(routine, people, starting_hour-1, 1, TRANSPORTATION, RandomLocation(routine, TRANSPORTATION, len(people))) # Transportation from home to activity
+    Assign(routine, people, starting_hour+3, 1, TRANSPORTATION, RandomLocation(routine, TRANSPORTATION, len(people))) # Transportation from activity to home
+    Assign(routine, people, starting_hour, 3, EXTRACURRICULAR, extracurricularID)
+
+
+def CreateRoutineYoungAdult(routine, people):
+    college = Chance(routine, 63, len(people)) # 63% chance to attend college/university, 37% chance to work
+    students, workers = people[college], people[~college]
+    Assign(routine, students, 9, 6, SCHOOL, RandomLocation(routine, SCHOOL, len(students)))
+    Assign(routine, workers, 9, 9, WORKPLACE, RandomLocation(routine, WORKPLACE, len(workers)))
+    Transport(routine, people, 8, np.where(college, 15, 18))
+
+    starting_hour = routine[3].integers(18, 21, len(people))
+    Assign(routine, people, starting_hour, 3, ENTERTAINMENT, RandomLocation(routine, ENTERTAINMENT, len(people))) # 3 afternoon/night hours for entertainment
+
+
+def CreateRoutineAdult(routine, people):
+    Assign(routine, people, 9, 9, WORKPLACE, RandomLocation(routine, WORKPLACE, len(people))) # Work
+    Transport(routine, people, 8, 18)
+
+    people = people[Chance(routine, 80, len(people))] # 80% chance for nighttime entertainment
+    entertainmentID = RandomLocation(routine, ENTERTAINMENT, len(people))
+    starting_hour = routine[3].integers(19, 21, len(people))
+    Assign(routine, people, starting_hour, 3, ENTERTAINMENT, entertainmentID)
+    Transport(routine, people, starting_hour-1, starting_hour+3)
+
+
+def CreateRoutineMiddleAged(routine, people):
+    Assign(routine, people, 9, 9, WORKPLACE, RandomLocation(routine, WORKPLACE, len(people))) # Work
+    Transport(routine, people, 8, 18)
+
+    people = people[Chance(routine, 50, len(people))] # 50% chance for nighttime entertainment
+    starting_hour = routine[3].integers(19, 23, len(people))
+    Assign(routine, people, starting_hour, 2, ENTERTAINMENT, RandomLocation(routine, ENTERTAINMENT, len(people)))
+
+
+def CreateRoutineElderly(routine, people):
+    starting_hour = routine[3].integers(10, 19, len(people))
+    Assign(routine, people, starting_hour, 4, OUTDOORS, 0) # Morning or afternoon walk
+    Transport(routine, people, starting_hour-1, starting_hour+4)
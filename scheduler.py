@@ -0,0 +1,98 @@
+import numpy as np
+
+# Event types, in the order they are applied at the end of a day.
+RECOVERY, DISCHARGE, HOSPITALIZATION = range(3)
+EVENT_NAMES = ["recovery", "discharge", "hospitalization"]
+
+
+class EventScheduler:
+    '''
+    Calendar queue of future per-person events (recovery, discharge, hospitalization).
+
+    The events of each day are kept in a bucket, one list of ID arrays per event type. The buckets form a ring indexed by
+    day % len(buckets), which covers every day from the first pending day on; it is doubled when an event is scheduled further ahead.
+    Scheduling appends to a bucket and PopDay concatenates a single bucket, so the cost per day does not depend on the
+    number of events pending for later days.
+    '''
+
+    def __init__(self, size=32):
+        self.buckets = [self.EmptyBucket() for i in range(size)]
+        self.start = 0 # First day that may have pending events.
+
+
+    def EmptyBucket(self):
+        return [[] for eventType in EVENT_NAMES]
+
+
+    def Schedule(self, day, eventType, people):
+        '''
+        Adds an event for the given people (array of IDs or a single ID) on the given (absolute) day.
+        '''
+        if (day < self.start):
+            raise ValueError("Cannot schedule an event on day " + str(day) + ", which has already been processed.")
+        while (day - self.start >= len(self.buckets)):
+            self.Grow()
+        self.buckets[day % len(self.buckets)][eventType].append(people)
+
+
+    def PopDay(self, day):
+        '''
+        Removes the events of the given day (and any earlier days) and returns them as a list with one array of IDs per event type.
+        '''
+        events = [[] for eventType in EVENT_NAMES]
+        while (self.start <= day):
+            slot = self.start % len(self.buckets)
+            for eventType, entries in enumerate(self.buckets[slot]):
+                events[eventType].extend(entries)
+            self.buckets[slot] = self.EmptyBucket()
+            self.start += 1
+        return [Concatenate(entries) for entries in events]
+
+
+    def Grow(self):
+        '''
+        Doubles the number of buckets, keeping every pending event in the bucket of its day.
+        '''
+        size = len(self.buckets)
+        buckets = [self.EmptyBucket() for i in range(2 * size)]
+        for day in range(self.start, self.start + size):
+            buckets[day % (2 * size)] = self.buckets[day % size]
+        self.buckets = buckets
+
+
+    def Events(self):
+        '''
+        Yields (day, event type, array of IDs) for every pending event, ordered by day.
+        '''
+        size = len(self.buckets)
+        for day in range(self.start, self.start + size):
+            for eventType, entries in enumerate(self.buckets[day % size]):
+                if (len(entries) > 0):
+                    yield day, eventType, Concatenate(entries)
+
+
+    def Pending(self):
+        '''
+        Returns the number of pending events.
+        '''
+        return sum(np.size(people) for bucket in self.buckets for entries in bucket for people in entries)
+
+
+    def Copy(self):
+        '''
+        Returns an independent scheduler with the same pending events (the ID arrays are shared, they are never modified).
+        '''
+        scheduler = EventScheduler.__new__(EventScheduler)
+        scheduler.buckets = [[list(entries) for entries in bucket] for bucket in self.buckets]
+        scheduler.start = self.start
+        return scheduler
+
+
+
+def Concatenate(entries):
+    '''
+    Joins the ID arrays (or single IDs) of a bucket into one int32 array.
+    '''
+    if (len(entries) == 0):
+        return np.zeros(0, dtype=np.int32)
+    return np.concatenate([np.atleast_1d(people) for people in entries]).astype(np.int32, copy=False)
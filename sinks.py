@@ -0,0 +1,155 @@
+'''
+Streaming output of the daily results while a simulation runs (see the "sinks" parameter of Model).
+
+At the end of every simulated day (and after the starting infections of day 0), the model passes the day's row of its
+recorder (see recorder.Recorder.Row) to the Day method of each sink. At the end of each Run, the sinks are flushed.
+
+The file sinks append to their file, so a long job can be followed with "tail -f", and the days written before the job was
+killed stay in the file (up to "flushInterval" days may be lost). A run continued from a checkpoint can append to the same file:
+the checkpoint stores the size of the file when it was saved, and checkpoint.LoadCheckpoint truncates the file to it, so the days
+simulated after the checkpoint by the killed job are not written twice.
+
+Example:
+    with JSONLinesSink("run.jsonl", flushInterval=7) as sink:
+        model = Model(1000000, daysOfSimulation=364, engine="vectorized", headless=True, sinks=[sink])
+        model.Run(364)
+'''
+
+import json
+
+
+class Sink:
+    '''
+    Base class of the sinks. Day is called with a dictionary (column name: int) for each day, in order.
+    '''
+
+    path = None # File of the sink (see FileSink), used to match the sink with its size in a checkpoint.
+
+    def Day(self, row):
+        pass
+
+
+    def Position(self):
+        '''
+        Returns the size of the sink's output so far (None if it has no file).
+        '''
+        return None
+
+
+    def Truncate(self, position):
+        '''
+        Drops the output written after the given Position (see checkpoint.LoadCheckpoint).
+        '''
+        pass
+
+
+    def Flush(self):
+        pass
+
+
+    def Close(self):
+        self.Flush()
+
+
+    def __enter__(self):
+        return self
+
+
+    def __exit__(self, excType, excValue, traceback):
+        self.Close()
+
+
+
+class CallbackSink(Sink):
+    '''
+    Calls the given function with the row of each day (e.g. to update a plot or send the progress of a job).
+    '''
+
+    def __init__(self, function):
+        self.function = function
+
+
+    def Day(self, row):
+        self.function(row)
+
+
+
+class FileSink(Sink):
+    '''
+    Writes one line per day to a text file (opened for appending).
+
+    flushInterval: Number of days between the flushes of the file (it is also flushed at the end of each Run and on Close).
+    '''
+
+    def __init__(self, path, flushInterval=1):
+        self.path = path
+        self.flushInterval = flushInterval
+        self.file = open(path, "a")
+        self.pendingDays = 0
+
+
+    def Day(self, row):
+        self.file.write(self.Line(row))
+        self.pendingDays += 1
+        if (self.pendingDays >= self.flushInterval):
+            self.Flush()
+
+
+    def Line(self, row):
+        raise NotImplementedError
+
+
+    def Position(self):
+        self.Flush()
+        return self.file.tell()
+
+
+    def Truncate(self, position):
+        self.Flush()
+        self.file.truncate(position)
+        self.file.seek(position)
+
+
+    def Flush(self):
+        if (not self.file.closed):
+            self.file.flush()
+        self.pendingDays = 0
+
+
+    def Close(self):
+        if (not self.file.closed):
+            self.file.close()
+
+
+
+class JSONLinesSink(FileSink):
+    '''
+    Writes each day as a JSON object on its own line.
+    '''
+
+    def Line(self, row):
+        return json.dumps(row) + "\n"
+
+
+
+class CSVSink(FileSink):
+    '''
+    Writes each day as a CSV line. The header is written first, unless the file already has content (continued run).
+    '''
+
+    def __init__(self, path, flushInterval=1):
+        super().__init__(path, flushInterval)
+        self.hasHeader = self.file.tell() > 0
+
+
+    def Truncate(self, position):
+        super().Truncate(position)
+        self.hasHeader = position > 0
+
+
+    def Line(self, row):
+        line = ",".join(str(value) for value in row.values()) + "\n"
+        if (not self.hasHeader):
+            self.hasHeader = True
+            return ",".join(row) + "\n" + line
+        return line
@@ -0,0 +1,83 @@
+'''
+Runs a headless Model (see Model.Run) for every combination of a parameter grid, several times each, on a pool of processes.
+
+Example:
+    table = RunSweep({"r0": [1.5, 2.5], "modelType": ["SIR", "SIS"]}, replicates=10, numberOfPpl=10000, daysOfSimulation=60)
+'''
+
+import itertools
+import os
+import numpy as np
+from randomness import SpawnSeeds
+from concurrent.futures import ProcessPoolExecutor
+
+
+def ParameterGrid(grid):
+    '''
+    Returns a list with one dictionary of Model parameters for each combination of the grid's values.
+
+    grid: Dictionary with a list of values for each Model parameter (e.g. {"r0": [1.0, 2.0], "daysOfInfection": [5, 7]}).
+    '''
+    names = list(grid)
+    return [dict(zip(names, values)) for values in itertools.product(*(grid[name] for name in names))]
+
+
+def RunSweep(grid, replicates=1, seed=0, workers=None, **parameters):
+    '''
+    Runs "replicates" simulations for each combination of the grid and returns the results as one table (see Table).
+
+    seed: Seed of the sweep. Each run gets its own seed (see randomness.SpawnSeeds), derived from this one and the run's index, so the results
+          do not depend on the number of workers or the order in which the runs finish.
+    workers: Number of processes (default: number of CPUs).
+    parameters: Model parameters shared by all runs (e.g. numberOfPpl=10000, engine="objects"). The engine is "vectorized" by default.
+    '''
+    combinations = ParameterGrid(grid)
+    runSeeds = SpawnSeeds(seed, len(combinations) * replicates)
+
+    tasks = []
+    for combination in combinations:
+        for replicate in range(replicates):
+            modelParameters = {"engine": "vectorized", **parameters, **combination}
+            tasks.append((len(tasks), replicate, modelParameters, runSeeds[len(tasks)]))
+
+    chunksize = max(1, len(tasks) // (4 * (workers or os.cpu_count() or 1))) # A few chunks per worker, so that the workers stay busy until the end.
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        runs = list(executor.map(RunReplicate, tasks, chunksize=chunksize))
+
+    return Table(runs, list(grid))
+
+
+def RunReplicate(task):
+    '''
+    Builds and runs a single headless Model in a worker process.
+
+    task: (run index, replicate index, Model parameters, numpy.random.SeedSequence of the run)
+    Returns (run index, replicate index, Model parameters, results of Model.Results).
+    '''
+    from model import Model # Imported by the worker.
+
+    run, replicate, modelParameters, runSeed = task
+    model = Model(**modelParameters, headless=True, seed=runSeed)
+    results = model.Run(model.daysOfSimulation)
+    return run, replicate, modelParameters, results
+
+
+def Table(runs, parameterNames):
+    '''
+    Gathers the results of the runs into one tidy table: a dictionary of NumPy columns with one row per run and day.
+    Columns: "run", "replicate", one column per grid parameter, "day", "S", "I", "R" and "emergencyLevel".
+    '''
+    runs = sorted(runs, key=lambda run: run[0])
+    lengths = [len(results["days"]) for run, replicate, modelParameters, results in runs]
+
+    table = {}
+    table["run"] = np.repeat([run[0] for run in runs], lengths)
+    table["replicate"] = np.repeat([run[1] for run in runs], lengths)
+    for name in parameterNames:
+        table[name] = np.repeat([run[2][name] for run in runs], lengths)
+
+    table["day"] = np.concatenate([run[3]["days"] for run in runs])
+    for state in ("S", "I", "R"):
+        table[state] = np.concatenate([run[3][state] for run in runs])
+    table["emergencyLevel"] = np.concatenate([run[3]["emergencyLevels"] for run in runs])
+    return table
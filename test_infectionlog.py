@@ -0,0 +1,35 @@
+'''
+The infection log of a run continued from a checkpoint must be the same, record by record, as the log of the uninterrupted run
+(including the infectors that are drawn by the log, see infectionlog.InfectionLog.ChooseInfectors).
+
+Run with: python -m pytest -q test_infectionlog.py
+'''
+
+import numpy as np
+import pytest
+from model import Model
+from checkpoint import LoadCheckpoint
+from infectionlog import InfectionLog, LoadInfectionLog
+
+PARAMETERS = {"numberOfPpl": 3000, "daysOfSimulation": 14, "r0": 2.5, "backend": "numpy", "headless": True, "seed": 5}
+
+
+@pytest.mark.parametrize("engine", ["objects", "vectorized"])
+@pytest.mark.parametrize("mode", [{"transmissionMode": "aggregate"}, {"hybridThreshold": 100}])
+def test_resumed_log_matches_uninterrupted_log(tmp_path, engine, mode):
+    with InfectionLog(str(tmp_path / "full.bin")) as log:
+        Model(**PARAMETERS, engine=engine, **mode, infectionLog=log).Run(14)
+
+    path = str(tmp_path / "resumed.bin")
+    checkpointPath = str(tmp_path / "run.npz")
+    with InfectionLog(path) as log:
+        model = Model(**PARAMETERS, engine=engine, **mode, infectionLog=log)
+        model.Run(8, checkpointInterval=8, checkpointPath=checkpointPath)
+        model.Run(2) # Days 9 and 10 are recorded, then the job is "killed".
+    with InfectionLog(path) as log:
+        LoadCheckpoint(checkpointPath, infectionLog=log).Run(6)
+
+    full = np.asarray(LoadInfectionLog(str(tmp_path / "full.bin")))
+    resumed = np.asarray(LoadInfectionLog(path))
+    assert len(full) > 0
+    assert np.array_equal(full, resumed)
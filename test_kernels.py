@@ -0,0 +1,47 @@
+'''
+Statistical equivalence of the two backends of the vectorized engine's hourly contacts (see Model's "backend" parameter):
+the same hourly state is simulated many times with the Numba kernel (kernels.ContactKernel) and with the NumPy implementation
+of VectorizedEngine.Hour, and the mean numbers of infections must agree. Skipped if Numba is not installed.
+
+Run with: python -m pytest -q test_kernels.py
+'''
+
+import numpy as np
+import pytest
+from model import Model
+from compartments import INFECTIOUS
+
+pytest.importorskip("numba")
+import kernels
+
+REPETITIONS = 300
+
+
+def HourlyInfections(model, hour, useKernel, seed):
+    '''
+    Returns the number of people infected during the given hour in each of REPETITIONS independent copies of the model (see Model.Fork).
+    '''
+    infections = np.empty(REPETITIONS, dtype=np.int64)
+    for repetition in range(REPETITIONS):
+        fork = model.Fork(seed=[seed, repetition])
+        engine = fork.vectorizedEngine
+        engine.useKernel = useKernel
+        engine.contactKernel = kernels.ContactKernel if (useKernel) else None
+        before = fork.compartments.Count(INFECTIOUS)
+        engine.Hour(hour)
+        infections[repetition] = fork.compartments.Count(INFECTIOUS) - before
+    return infections
+
+
+@pytest.mark.parametrize("hour", [0, 8, 10, 19]) # Night at home (first hour of the block), commute, work and school, evening.
+@pytest.mark.parametrize("stepping", ["hourly", "blocks"])
+def test_backends_infect_the_same_number_of_people(hour, stepping):
+    model = Model(5000, startingInfectiousPercentage=5, daysOfSimulation=2, r0=3, engine="vectorized", stepping=stepping,
+                  backend="numpy", headless=True, seed=7)
+    model.Run(2)
+
+    kernel = HourlyInfections(model, hour, True, 1)
+    numpy = HourlyInfections(model, hour, False, 2)
+    standardError = np.sqrt((kernel.var() + numpy.var()) / REPETITIONS)
+    assert kernel.mean() > 0 and numpy.mean() > 0
+    assert abs(kernel.mean() - numpy.mean()) <= 4 * standardError
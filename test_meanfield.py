@@ -0,0 +1,24 @@
+'''
+The mean-field approximation must stay close to the agent model it is calibrated from (see meanfield.MeanField):
+final size and peak of the Infectious percentage against the mean of a few seeded runs of the vectorized engine.
+
+Run with: python -m pytest -q test_meanfield.py
+'''
+
+import numpy as np
+import pytest
+from model import Model
+from meanfield import MeanField
+
+PARAMETERS = {"numberOfPpl": 10000, "daysOfSimulation": 100, "engine": "vectorized", "backend": "numpy", "headless": True}
+FINAL_SIZE_TOLERANCE = 4 # Percentage points of Recovered people at the end.
+PEAK_TOLERANCE = 2.5 # Percentage points of Infectious people at the peak.
+
+
+@pytest.mark.parametrize("r0", [1.5, 2.5])
+def test_mean_field_matches_agent_model(r0):
+    agents = [Model(**PARAMETERS, r0=r0, seed=seed).Run(100) for seed in range(3)]
+    meanField = MeanField(Model(**PARAMETERS, r0=r0, seed=0)).Run(100)
+
+    assert abs(meanField["R"][-1] - np.mean([results["R"][-1] for results in agents])) <= FINAL_SIZE_TOLERANCE
+    assert abs(meanField["I"].max() - np.mean([results["I"].max() for results in agents])) <= PEAK_TOLERANCE
@@ -0,0 +1,26 @@
+'''
+The "blocks" stepping mode (see Model) must give the same dynamics as the "hourly" mode, within a tolerance:
+peak and final size of the mean of a few seeded runs of each mode.
+
+Run with: python -m pytest -q test_stepping.py
+'''
+
+import numpy as np
+from model import Model
+
+PARAMETERS = {"numberOfPpl": 10000, "r0": 2.5, "daysOfSimulation": 60, "backend": "numpy", "headless": True}
+SEEDS = range(3)
+PEAK_TOLERANCE = 1.5 # Percentage points of Infectious people at the peak.
+FINAL_SIZE_TOLERANCE = 3 # Percentage points of Recovered people at the end.
+
+
+def MeanPeakAndFinalSize(stepping):
+    results = [Model(**PARAMETERS, engine="vectorized", stepping=stepping, seed=seed).Run(60) for seed in SEEDS]
+    return np.mean([result["I"].max() for result in results]), np.mean([result["R"][-1] for result in results])
+
+
+def test_blocks_match_hourly_stepping():
+    hourlyPeak, hourlyFinalSize = MeanPeakAndFinalSize("hourly")
+    blocksPeak, blocksFinalSize = MeanPeakAndFinalSize("blocks")
+    assert abs(blocksPeak - hourlyPeak) <= PEAK_TOLERANCE
+    assert abs(blocksFinalSize - hourlyFinalSize) <= FINAL_SIZE_TOLERANCE
@@ -1,5 +1,11 @@
 import math
 
+# Integer codes for each kind of location, used by the array-based engine.
+# The order matches "town.locations" (houses first, outdoors last).
+HOUSE, SCHOOL, WORKPLACE, HOSPITAL, ENTERTAINMENT, TRANSPORTATION, EXTRACURRICULAR, OUTDOORS = range(8)
+LOCATION_NAMES = ["House", "School", "Workplace", "Hospital", "Entertainment", "Transportation", "Extracurricular", "Outdoors"]
+LOCATION_CODES = {name: code for code, name in enumerate(LOCATION_NAMES)}
+
 class Town:
     '''
     Class that represents the entire city and its components.
@@ -33,6 +39,13 @@ class Town:
         self.hospitals.append(Hospital()) # Create 1 hospital.
         self.outdoors.append(Outdoors()) # Create 1 outdoors location.
 
+
+    def LocationCounts(self):
+        '''
+        Returns the number of locations of each kind, ordered by location code.
+        '''
+        return [len(self.houses), len(self.schools), len(self.workplaces), len(self.hospitals), len(self.entertainments), len(self.transportations), len(self.extracurriculars), len(self.outdoors)]
+
         
 '''
 Separate class for each kind of location.
@@ -59,6 +72,10 @@ class Entertainment:
         Returns a boolean value depending if the location is full or not.
         The maximum capacity depends on the current Emergency Level.
         '''
+        return (len(self.currentVisitors) >= Entertainment.Capacity(emergencyLevel))
+
+    @staticmethod
+    def Capacity(emergencyLevel):
         capacity = 500
         if (emergencyLevel == 1):
             capacity = 100
@@ -66,8 +83,7 @@ class Entertainment:
             capacity = 50
         elif (emergencyLevel == 3):
             capacity = 0
-            
-        return (len(self.currentVisitors) >= capacity)
+        return capacity
         
 class Extracurricular:
     def __init__(self):   
@@ -78,8 +94,11 @@ class Transportation:
         self.currentVisitors = []  
         
     def IsFull(self, emergencyLevel):
-        capacity = 80 - emergencyLevel*20 # Emergency Levels: 0, 1, 2, 3. Maximum Capacities: 80, 60, 40, 20.
-        return (len(self.currentVisitors) >= capacity)
+        return (len(self.currentVisitors) >= Transportation.Capacity(emergencyLevel))
+
+    @staticmethod
+    def Capacity(emergencyLevel):
+        return 80 - emergencyLevel*20 # Emergency Levels: 0, 1, 2, 3. Maximum Capacities: 80, 60, 40, 20.
         
 class Outdoors:
     def __init__(self):   
@@ -89,7 +108,9 @@ class Hospital:
     def __init__(self):  
         self.currentVisitors = []    
     
-    def IsFull(self): # Maximum capacity: 200 people.
-        return (len(self.currentVisitors) >= 200)
+    capacity = 200 # Maximum capacity: 200 people.
+
+    def IsFull(self):
+        return (len(self.currentVisitors) >= Hospital.capacity)
 
 
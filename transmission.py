@@ -0,0 +1,58 @@
+import numpy as np
+from town import SCHOOL, WORKPLACE, ENTERTAINMENT, TRANSPORTATION, EXTRACURRICULAR, OUTDOORS
+
+# MASK_LOCATIONS[level][code] is True if masks are mandatory at that kind of location (see Person.IsWearingMask).
+MASK_LOCATIONS = np.zeros((4, 8), dtype=bool)
+MASK_LOCATIONS[1:, [TRANSPORTATION, SCHOOL, WORKPLACE, EXTRACURRICULAR, ENTERTAINMENT]] = True
+MASK_LOCATIONS[2:, OUTDOORS] = True
+
+
+class Transmission:
+    '''
+    Coefficients of the interactions (see Model.PeopleInteractions and Model.Interaction), computed once per person
+    instead of for every interaction.
+
+    transmissionBase: Chance of transmission for each interaction of an infectious person (r0 / total interactions during
+                      the infectious period), multiplied by their hygiene factor.
+    hygieneFactor: The other person's part of the chance.
+    obedience: Chance to wear a mask where it is mandatory (see Person.IsWearingMaskUtil).
+    maskRequired: Whether masks are mandatory at each kind of location (by location code), for the current Emergency Level.
+    numberOfInteractions: (N, 24) number of people each person interacts with per hour, for the current Emergency Level.
+
+    The Emergency Level coefficients are refreshed by SetEmergencyLevel. The expected interactions come from the default routines,
+    which do not change during the simulation.
+    '''
+
+    def __init__(self, population, r0, daysOfInfection):
+        self.interactions = population.Interactions() # (N, 24) expected interactions per hour.
+        self.legalityFactor = population.legalityFactor.astype(np.float64)
+        self.hygieneFactor = population.hygieneFactor.astype(np.float64)
+        self.obedience = np.minimum(self.legalityFactor, 1)
+
+        total_interactions = self.interactions.sum(axis=1, dtype=np.float64) * daysOfInfection # Daily interactions * Infectious period.
+        self.transmissionBase = r0 / total_interactions * self.hygieneFactor
+
+        self.SetEmergencyLevel(0)
+
+
+    def SetEmergencyLevel(self, level):
+        self.emergencyLevel = level
+        self.maskRequired = MASK_LOCATIONS[level]
+
+        self.numberOfInteractions = self.NumberOfInteractions(level)
+
+
+    def NumberOfInteractions(self, level):
+        '''
+        Returns the (N, 24) number of people each person interacts with per hour at the given Emergency Level.
+        '''
+        sdf = 1 - 0.2 * level # Social Distacing Factor
+        return np.ceil(np.ceil(self.interactions * sdf) * self.legalityFactor[:, None]).astype(np.int8)
+
+
+    def MaskFactor(self, people):
+        '''
+        Returns the average factor of the given people's masks on the transmission chance, where masks are mandatory:
+        each person wears one with probability equal to their obedience, and a mask reduces the chance by 80%.
+        '''
+        return 1 - 0.8 * self.obedience[people]